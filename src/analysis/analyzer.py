@@ -5,59 +5,175 @@ This module contains classes and functions for analyzing DMARC reports
 and generating statistics and recommendations.
 """
 
+import sys
+from bisect import bisect_left
 from collections import defaultdict
 from datetime import datetime, timedelta
 
 from utils.helpers import TIME_PERIODS
 
+# Sort key for period keys, shortest first with 'all' last
+_PERIOD_SORT_ORDER = {period: days if days is not None else float('inf')
+                      for period, days in TIME_PERIODS.items()}
+
+
+def _empty_stats():
+    """Create an empty statistics dict for a set of reports."""
+    return {
+        'total_messages': 0,
+        'domains': set(),
+        'domain_stats': {},
+        'reporting_orgs': set(),
+        'ips': {},
+        'dkim_overall': {'pass': 0, 'fail': 0},
+        'spf_overall': {'pass': 0, 'fail': 0},
+        'dmarc_overall': {'pass': 0, 'fail': 0},
+        'disposition_overall': defaultdict(int),
+        'failures_by_domain': defaultdict(int),
+        'date_range': {'begin': None, 'end': None}
+    }
+
+
+def _new_domain_stats():
+    """Create empty per-domain statistics."""
+    return {
+        'count': 0,
+        'dkim_pass': 0,
+        'dkim_fail': 0,
+        'spf_pass': 0,
+        'spf_fail': 0,
+        'fully_aligned': 0,
+        'current_policy': 'none',
+        'current_pct': 100,
+        'current_sp': 'none',
+        'sending_sources': set(),
+        'policy_applied': defaultdict(int)
+    }
+
+
+def _new_ip_stats():
+    """Create empty per-IP statistics."""
+    return {
+        'count': 0,
+        'domains': set(),
+        'dkim_pass': 0,
+        'dkim_fail': 0,
+        'spf_pass': 0,
+        'spf_fail': 0,
+        'fully_aligned': 0,
+        'disposition': defaultdict(int)
+    }
+
+
+def _merge_stats(target, source):
+    """
+    Fold the statistics calculated for one set of reports into another.
+    
+    ``source`` must cover reports that are newer than those already in
+    ``target``, so its published policy values take precedence. Nothing in
+    ``source`` is shared with ``target`` afterwards.
+    
+    Args:
+        target: Statistics dict to update in place
+        source: Statistics dict to merge into ``target``
+    """
+    target['total_messages'] += source['total_messages']
+    target['domains'] |= source['domains']
+    target['reporting_orgs'] |= source['reporting_orgs']
+    
+    for domain, src in source['domain_stats'].items():
+        if domain not in target['domain_stats']:
+            target['domain_stats'][domain] = _new_domain_stats()
+        dst = target['domain_stats'][domain]
+        for field in ('count', 'dkim_pass', 'dkim_fail', 'spf_pass', 'spf_fail', 'fully_aligned'):
+            dst[field] += src[field]
+        dst['current_policy'] = src['current_policy']
+        dst['current_pct'] = src['current_pct']
+        dst['current_sp'] = src['current_sp']
+        dst['sending_sources'] |= src['sending_sources']
+        for disposition, count in src['policy_applied'].items():
+            dst['policy_applied'][disposition] += count
+    
+    for source_ip, src in source['ips'].items():
+        if source_ip not in target['ips']:
+            target['ips'][source_ip] = _new_ip_stats()
+        dst = target['ips'][source_ip]
+        for field in ('count', 'dkim_pass', 'dkim_fail', 'spf_pass', 'spf_fail', 'fully_aligned'):
+            dst[field] += src[field]
+        dst['domains'] |= src['domains']
+        for disposition, count in src['disposition'].items():
+            dst['disposition'][disposition] += count
+    
+    for key in ('dkim_overall', 'spf_overall', 'dmarc_overall'):
+        target[key]['pass'] += source[key]['pass']
+        target[key]['fail'] += source[key]['fail']
+    for disposition, count in source['disposition_overall'].items():
+        target['disposition_overall'][disposition] += count
+    for domain, count in source['failures_by_domain'].items():
+        target['failures_by_domain'][domain] += count
+    
+    begin = source['date_range']['begin']
+    end = source['date_range']['end']
+    if begin and (target['date_range']['begin'] is None or begin < target['date_range']['begin']):
+        target['date_range']['begin'] = begin
+    if end and (target['date_range']['end'] is None or end > target['date_range']['end']):
+        target['date_range']['end'] = end
+
 
 def _calculate_stats_for_reports(reports_list):
     """
     Helper function to calculate DMARC statistics for a given list of reports.
     
+    Records are first summed per distinct combination of their categorical
+    fields. Per-domain and per-IP counters are then accumulated from those
+    groups in flat dicts (one per field) and only assembled into the nested
+    ``domain_stats``/``ips`` structures at the end. Failure counts are derived
+    from the totals rather than tracked separately.
+    
     Args:
         reports_list: List of parsed DMARC reports
         
     Returns:
         dict: Statistics calculated from the reports
     """
-    stats = {
-        'total_messages': 0,
-        'domains': set(),
-        'domain_stats': defaultdict(lambda: {
-            'count': 0,
-            'dkim_pass': 0,
-            'dkim_fail': 0,
-            'spf_pass': 0,
-            'spf_fail': 0,
-            'fully_aligned': 0,
-            'current_policy': 'none',
-            'current_pct': 100,
-            'current_sp': 'none',
-            'sending_sources': set(),
-            'policy_applied': defaultdict(int)
-        }),
-        'reporting_orgs': set(),
-        'ips': defaultdict(lambda: {
-            'count': 0,
-            'domains': set(),
-            'dkim_pass': 0,
-            'dkim_fail': 0,
-            'spf_pass': 0,
-            'spf_fail': 0,
-            'fully_aligned': 0,
-            'disposition': defaultdict(int)
-        }),
-        'dkim_overall': {'pass': 0, 'fail': 0},
-        'spf_overall': {'pass': 0, 'fail': 0},
-        'disposition_overall': defaultdict(int),
-        'failures_by_domain': defaultdict(int),
-        'date_range': {'begin': None, 'end': None}
-    }
+    stats = _empty_stats()
 
     if not reports_list:  # Handle empty list of reports
         return stats
 
+    # Most recent published policy per domain: (p, pct, sp)
+    domain_policy = {}
+    
+    # Per-domain counters (messages whose header_from matches the policy domain)
+    domain_count = defaultdict(int)
+    domain_dkim_pass = defaultdict(int)
+    domain_spf_pass = defaultdict(int)
+    domain_aligned = defaultdict(int)
+    domain_sources = defaultdict(list)  # made unique during assembly
+    domain_policy_applied = defaultdict(int)  # keyed by (domain, disposition)
+    
+    # Per-IP counters
+    ip_count = defaultdict(int)
+    ip_dkim_pass = defaultdict(int)
+    ip_spf_pass = defaultdict(int)
+    ip_aligned = defaultdict(int)
+    ip_domains = defaultdict(list)  # made unique during assembly
+    ip_disposition = defaultdict(int)  # keyed by (source_ip, disposition)
+    
+    # Bind the remaining containers and totals to locals for the loops below
+    date_range = stats['date_range']
+    reporting_orgs = stats['reporting_orgs']
+    domains = stats['domains']
+    failures_by_domain = stats['failures_by_domain']
+    total_messages = 0
+    dkim_overall_pass = 0
+    spf_overall_pass = 0
+    dmarc_overall_pass = 0
+    
+    # Message counts keyed by
+    # (domain, source_ip, header_from, disposition, dkim_result, spf_result)
+    record_groups = defaultdict(int)
+
     for report in reports_list:
         if not report:
             continue
@@ -71,75 +187,122 @@ def _calculate_stats_for_reports(reports_list):
         end_date_dt = metadata.get('end_date_dt')
 
         if begin_date_dt:
-            if stats['date_range']['begin'] is None or begin_date_dt < stats['date_range']['begin']:
-                stats['date_range']['begin'] = begin_date_dt
+            if date_range['begin'] is None or begin_date_dt < date_range['begin']:
+                date_range['begin'] = begin_date_dt
         if end_date_dt:
-            if stats['date_range']['end'] is None or end_date_dt > stats['date_range']['end']:
-                stats['date_range']['end'] = end_date_dt
+            if date_range['end'] is None or end_date_dt > date_range['end']:
+                date_range['end'] = end_date_dt
         
-        stats['reporting_orgs'].add(metadata.get('org_name', 'Unknown'))
+        reporting_orgs.add(metadata.get('org_name', 'Unknown'))
         domain = policy.get('domain', 'Unknown')
-        stats['domains'].add(domain)
+        domains.add(domain)
         
-        domain_stats = stats['domain_stats'][domain]
-        domain_stats['current_policy'] = policy.get('policy', 'none')
-        domain_stats['current_pct'] = int(policy.get('pct', '100'))
-        # Ensure current_sp gets the most recent value from the reports for this period
-        domain_stats['current_sp'] = policy.get('subpolicy', domain_stats['current_policy'])
+        # Ensure the policy values are the most recent ones for this period
+        current_policy = policy.get('policy', 'none')
+        domain_policy[domain] = (
+            current_policy,
+            int(policy.get('pct', '100')),
+            policy.get('subpolicy', current_policy)
+        )
         
+        # Group records sharing the same categorical fields so that the
+        # per-field counters below are updated once per distinct combination
+        # rather than once per record
         for record in records:
-            msg_count = record.get('count', 0)
-            stats['total_messages'] += msg_count
-            
-            source_ip = record.get('source_ip', 'Unknown')
-            header_from = record.get('header_from', 'Unknown')
-            dkim_result = record.get('dkim_result', 'unknown')
-            spf_result = record.get('spf_result', 'unknown')
-            disposition = record.get('disposition', 'unknown')
-            
-            if header_from == domain:
-                domain_stats['count'] += msg_count
-                domain_stats['sending_sources'].add(source_ip)
-                domain_stats['policy_applied'][disposition] += msg_count
-                
-                if dkim_result.lower() == 'pass':
-                    domain_stats['dkim_pass'] += msg_count
-                else:
-                    domain_stats['dkim_fail'] += msg_count
-                
-                if spf_result.lower() == 'pass':
-                    domain_stats['spf_pass'] += msg_count
-                else:
-                    domain_stats['spf_fail'] += msg_count
-                    
-                if dkim_result.lower() == 'pass' or spf_result.lower() == 'pass':
-                    domain_stats['fully_aligned'] += msg_count
-            
-            ip_stats = stats['ips'][source_ip]
-            ip_stats['count'] += msg_count
-            ip_stats['domains'].add(header_from)
-            ip_stats['disposition'][disposition] += msg_count
-            
-            if dkim_result.lower() == 'pass':
-                ip_stats['dkim_pass'] += msg_count
-                stats['dkim_overall']['pass'] += msg_count
-            else:
-                ip_stats['dkim_fail'] += msg_count
-                stats['dkim_overall']['fail'] += msg_count
-                stats['failures_by_domain'][header_from] += msg_count
-            
-            if spf_result.lower() == 'pass':
-                ip_stats['spf_pass'] += msg_count
-                stats['spf_overall']['pass'] += msg_count
-            else:
-                ip_stats['spf_fail'] += msg_count
-                stats['spf_overall']['fail'] += msg_count
-                stats['failures_by_domain'][header_from] += msg_count
-            
-            if dkim_result.lower() == 'pass' or spf_result.lower() == 'pass':
-                ip_stats['fully_aligned'] += msg_count
-            
-            stats['disposition_overall'][disposition] += msg_count
+            record_groups[(
+                domain,
+                record.get('source_ip', 'Unknown'),
+                record.get('header_from', 'Unknown'),
+                record.get('disposition', 'unknown'),
+                record.get('dkim_result', 'unknown'),
+                record.get('spf_result', 'unknown')
+            )] += record.get('count', 0)
+    
+    for (domain, source_ip, header_from, disposition, dkim_result, spf_result), msg_count in record_groups.items():
+        total_messages += msg_count
+        
+        # Results are lowercased by the parser
+        dkim_pass = dkim_result == 'pass'
+        spf_pass = spf_result == 'pass'
+        aligned = dkim_pass or spf_pass
+        
+        if header_from == domain:
+            domain_count[domain] += msg_count
+            domain_sources[domain].append(source_ip)
+            domain_policy_applied[(domain, disposition)] += msg_count
+            if dkim_pass:
+                domain_dkim_pass[domain] += msg_count
+            if spf_pass:
+                domain_spf_pass[domain] += msg_count
+            if aligned:
+                domain_aligned[domain] += msg_count
+        
+        ip_count[source_ip] += msg_count
+        ip_domains[source_ip].append(header_from)
+        ip_disposition[(source_ip, disposition)] += msg_count
+        
+        if dkim_pass:
+            ip_dkim_pass[source_ip] += msg_count
+            dkim_overall_pass += msg_count
+        
+        if spf_pass:
+            ip_spf_pass[source_ip] += msg_count
+            spf_overall_pass += msg_count
+        
+        # Messages that failed both checks failed DMARC; count them once
+        if aligned:
+            ip_aligned[source_ip] += msg_count
+            dmarc_overall_pass += msg_count
+        else:
+            failures_by_domain[header_from] += msg_count
+    
+    # Assemble the nested structures expected by recommendations and reporters
+    domain_stats = stats['domain_stats']
+    for domain, (current_policy, current_pct, current_sp) in domain_policy.items():
+        count = domain_count[domain]
+        dkim_pass_count = domain_dkim_pass[domain]
+        spf_pass_count = domain_spf_pass[domain]
+        domain_stats[domain] = {
+            'count': count,
+            'dkim_pass': dkim_pass_count,
+            'dkim_fail': count - dkim_pass_count,
+            'spf_pass': spf_pass_count,
+            'spf_fail': count - spf_pass_count,
+            'fully_aligned': domain_aligned[domain],
+            'current_policy': current_policy,
+            'current_pct': current_pct,
+            'current_sp': current_sp,
+            'sending_sources': set(domain_sources[domain]),
+            'policy_applied': defaultdict(int)
+        }
+    for (domain, disposition), count in domain_policy_applied.items():
+        domain_stats[domain]['policy_applied'][disposition] = count
+    
+    ips = stats['ips']
+    for source_ip, count in ip_count.items():
+        dkim_pass_count = ip_dkim_pass[source_ip]
+        spf_pass_count = ip_spf_pass[source_ip]
+        ips[source_ip] = {
+            'count': count,
+            'domains': set(ip_domains[source_ip]),
+            'dkim_pass': dkim_pass_count,
+            'dkim_fail': count - dkim_pass_count,
+            'spf_pass': spf_pass_count,
+            'spf_fail': count - spf_pass_count,
+            'fully_aligned': ip_aligned[source_ip],
+            'disposition': defaultdict(int)
+        }
+    # Overall dispositions are summed from the per-IP totals, one update per
+    # distinct (source_ip, disposition) pair
+    disposition_overall = stats['disposition_overall']
+    for (source_ip, disposition), count in ip_disposition.items():
+        ips[source_ip]['disposition'][disposition] = count
+        disposition_overall[disposition] += count
+    
+    stats['total_messages'] = total_messages
+    stats['dkim_overall'] = {'pass': dkim_overall_pass, 'fail': total_messages - dkim_overall_pass}
+    stats['spf_overall'] = {'pass': spf_overall_pass, 'fail': total_messages - spf_overall_pass}
+    stats['dmarc_overall'] = {'pass': dmarc_overall_pass, 'fail': total_messages - dmarc_overall_pass}
     
     return stats
 
@@ -157,85 +320,86 @@ def analyze_reports(all_sorted_reports, time_periods=None):
     """
     if time_periods is None:
         time_periods = ['30', 'all']
-        
-    if not all_sorted_reports:
-        # If no reports, return empty stats for all requested periods
-        empty_stats = _calculate_stats_for_reports([])
-        stats_bundle = {'periods': {}}
-        for period in time_periods:
-            stats_bundle['periods'][period] = {
-                'stats': empty_stats,
-                'is_meaningful': False
-            }
-        return stats_bundle
-
-    # Find the latest date across all reports to anchor time period calculations
-    max_end_date = None
+    
+    # Order reports by end date once so that each period window is a suffix
+    # of the list and its boundary can be found with a binary search over the
+    # integer end timestamps. The stable sort keeps the incoming order for
+    # reports ending together.
+    dated_reports = []
+    undated_reports = []
     for r in all_sorted_reports:
-        report_end_date = r.get('metadata', {}).get('end_date_dt')
-        if report_end_date:
-            if max_end_date is None or report_end_date > max_end_date:
-                max_end_date = report_end_date
+        metadata = r['metadata']
+        end_ts = metadata.get('end_ts')
+        if end_ts is None and metadata.get('end_date_dt') is not None:
+            end_ts = int(metadata['end_date_dt'].timestamp())
+        if end_ts is not None:
+            dated_reports.append((end_ts, r))
+        else:
+            print(f"Report from {metadata.get('org_name', 'Unknown')} has no end date; "
+                  f"only including it in all-time statistics", file=sys.stderr)
+            undated_reports.append(r)
+    dated_reports.sort(key=lambda item: item[0])
+    end_timestamps = [end_ts for end_ts, _ in dated_reports]
+    dated_reports = [r for _, r in dated_reports]
 
-    # If we couldn't determine a max date, use current datetime as fallback
-    if max_end_date is None:
-        max_end_date = datetime.now()
+    # Anchor time period calculations on the latest date across all reports,
+    # falling back to the current datetime if none could be determined
+    max_end_date = datetime.fromtimestamp(end_timestamps[-1]) if end_timestamps else datetime.now()
 
+    # Periods are nested windows ending at max_end_date, so split the reports
+    # into disjoint bands (newest first) and calculate stats for each band once.
+    # bands[i] holds reports inside the window of day_periods[i] but not of any
+    # narrower one; the last band holds reports outside every day-based window.
+    day_periods = sorted((p for p in set(time_periods) if TIME_PERIODS[p] is not None),
+                         key=_PERIOD_SORT_ORDER.get)
+    
+    bands = []
+    band_end = len(dated_reports)
+    for period_key in day_periods:
+        period_start_ts = int((max_end_date - timedelta(days=TIME_PERIODS[period_key])).timestamp())
+        band_start = bisect_left(end_timestamps, period_start_ts, 0, band_end)
+        bands.append(dated_reports[band_start:band_end])
+        band_end = band_start
+    bands.append(undated_reports + dated_reports[:band_end])
+    
+    if 'all' not in time_periods:
+        bands.pop()
+    band_stats = [_calculate_stats_for_reports(band) for band in bands]
+    
+    def combine_bands(num_bands):
+        """Merge the newest ``num_bands`` bands, oldest first."""
+        if num_bands == 1:
+            return band_stats[0]
+        combined = _empty_stats()
+        for i in reversed(range(num_bands)):
+            _merge_stats(combined, band_stats[i])
+        return combined
+    
     # Calculate statistics for all requested time periods
     stats_bundle = {'periods': {}}
     
     for period_key in time_periods:
         days = TIME_PERIODS[period_key]
         
-        # For 'all' time period, use all reports
         if period_key == 'all':
-            period_stats = _calculate_stats_for_reports(all_sorted_reports)
-            stats_bundle['periods']['all'] = {
-                'stats': period_stats,
-                'is_meaningful': period_stats['total_messages'] > 0,
-                'days': None  # Represents all time
-            }
-            continue
-        
-        # For specific day-based periods, filter reports within the time window
-        period_start = max_end_date - timedelta(days=days)
-        filtered_reports = []
-        
-        for r in all_sorted_reports:
-            report_end_date = r.get('metadata', {}).get('end_date_dt')
-            if report_end_date and report_end_date >= period_start:
-                filtered_reports.append(r)
-        
-        period_stats = _calculate_stats_for_reports(filtered_reports)
+            period_stats = combine_bands(len(band_stats))
+        else:
+            period_stats = combine_bands(day_periods.index(period_key) + 1)
         
         # A period is considered meaningful if it has at least 1 report with messages
-        is_meaningful = len(filtered_reports) > 0 and period_stats['total_messages'] > 0
-        
         stats_bundle['periods'][period_key] = {
             'stats': period_stats,
-            'is_meaningful': is_meaningful,
-            'days': days
+            'is_meaningful': period_stats['total_messages'] > 0,
+            'days': days  # None represents all time
         }
     
-    # Set a default period for primary display based on meaningful data availability
-    # Prefer 30 days if available, otherwise use the smallest meaningful period
-    default_period = None
-    if 'periods' in stats_bundle:
-        if '30' in stats_bundle['periods'] and stats_bundle['periods']['30']['is_meaningful']:
-            default_period = '30'
-        else:
-            # Find the smallest meaningful period
-            for period in sorted(stats_bundle['periods'].keys(), 
-                                key=lambda x: 9999 if x == 'all' else int(x)):
-                if stats_bundle['periods'][period]['is_meaningful']:
-                    default_period = period
-                    break
-            
-            # If no meaningful periods found, default to 'all'
-            if default_period is None and 'all' in stats_bundle['periods']:
-                default_period = 'all'
-    
-    stats_bundle['default_period'] = default_period
+    # Set a default period for primary display based on meaningful data availability:
+    # the smallest meaningful period (so 30 days when it has data), otherwise 'all'
+    periods = stats_bundle['periods']
+    stats_bundle['default_period'] = next(
+        (period for period in sorted(periods, key=_PERIOD_SORT_ORDER.get) if periods[period]['is_meaningful']),
+        'all' if 'all' in periods else None
+    )
     return stats_bundle
 
 
@@ -252,15 +416,15 @@ def generate_policy_recommendations(stats_bundle, period_key=None):
     """
     # If no specific period is provided, use the default period
     if period_key is None:
-        period_key = stats_bundle.get('default_period', 'all')
+        period_key = stats_bundle['default_period']
     
     # Ensure the requested period exists
-    if period_key not in stats_bundle.get('periods', {}):
+    if period_key not in stats_bundle['periods']:
         period_key = 'all'  # Fallback to all time if requested period doesn't exist
     
     period_data = stats_bundle['periods'][period_key]
     stats = period_data['stats']
-    days = period_data.get('days')
+    days = period_data['days']
     
     recommendations = []
     
@@ -286,7 +450,7 @@ def generate_policy_recommendations(stats_bundle, period_key=None):
         
         current_policy = domain_stats['current_policy']
         current_pct = domain_stats['current_pct']
-        current_sp = domain_stats.get('current_sp', current_policy) # .get because current_sp might not be in older structure
+        current_sp = domain_stats['current_sp']
 
         # Add a note about which period's data is being used
         if days:
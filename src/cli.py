@@ -8,29 +8,95 @@ handling argument parsing and the main program flow.
 import os
 import sys
 import glob
+import gzip
 import argparse
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-from parsers.dmarc_parser import extract_xml_from_file, parse_dmarc_report
-from analysis.analyzer import analyze_reports
-from reporting.text_report import generate_report
+from parsers.dmarc_parser import extract_xml_from_file, parse_dmarc_report, xml_parser_name
+from analysis.analyzer import analyze_reports, generate_policy_recommendations
+from utils.cache import get_cache_dir, load_cached_report, store_cached_report, prune_cache
+from utils import dns_cache
+from reporting.text_report import iter_report_lines
 from reporting.html_report import generate_html_report
 
 
+def _positive_int(value):
+    """Parse a command-line argument as a positive integer."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value!r}")
+    return number
+
+
 def parse_args():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description='Analyze DMARC reports in a directory')
     parser.add_argument('directory', help='Directory containing DMARC reports')
-    parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+    parser.add_argument('--output', '-o', help='Output file, gzip-compressed if it ends in .gz (default: stdout)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
     parser.add_argument('--html', action='store_true', help='Generate HTML report')
-    parser.add_argument('--html-output', help='HTML output file (default: dmarc_report.html)')
+    parser.add_argument('--html-output', help='HTML output file, gzip-compressed if it ends in .gz (default: dmarc_report.html)')
     parser.add_argument('--resolve-ips', '-r', action='store_true', help='Resolve IP addresses to hostnames')
     parser.add_argument('--time-periods', '-t', nargs='+', choices=['30', '90', '180', '360', 'all'], 
                        default=['30', '90', '180', '360', 'all'], help='Time periods in days to include in report (default: 30 days and all time)')
+    parser.add_argument('--jobs', '-j', type=_positive_int, help='Number of report files to parse in parallel (default: number of CPUs)')
+    parser.add_argument('--safe-xml', action='store_true', help='Always parse reports with defusedxml, even if lxml is installed')
+    parser.add_argument('--no-cache', action='store_true', help='Parse every report file and look up every IP instead of reusing cached results')
     return parser.parse_args()
 
 
+def _process_report_file(filepath, parse_auth_details=False, safe_xml=False, cache_dir=None):
+    """
+    Extract and parse a single DMARC report file.
+    
+    Args:
+        filepath: Path to the DMARC report file
+        parse_auth_details: Whether to extract per-record DKIM/SPF auth results
+        safe_xml: Whether to always parse with defusedxml
+        cache_dir: Directory for cached parsed reports, or None to disable caching
+        
+    Returns:
+        tuple: The parsed report (or None) and a short status message
+    """
+    xml_parser = xml_parser_name(safe_xml)
+    if cache_dir:
+        report = load_cached_report(cache_dir, filepath, parse_auth_details, xml_parser)
+        if report:
+            return report, "OK (cached)"
+    
+    xml_stream = extract_xml_from_file(filepath)
+    if not xml_stream:
+        return None, "Failed to extract XML"
+    
+    with xml_stream:
+        report = parse_dmarc_report(xml_stream, parse_auth_details=parse_auth_details, safe_xml=safe_xml)
+    if not report:
+        return None, "Failed to parse"
+    
+    if cache_dir:
+        store_cached_report(cache_dir, filepath, report, parse_auth_details, xml_parser)
+    return report, "OK"
+
+
+def _open_output(path):
+    """Open an output file for writing text, gzip-compressing it if the name ends in .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w')
+
+
+def _write_report(f, lines):
+    """Write report lines separated by newlines, without a trailing newline."""
+    for i, line in enumerate(lines):
+        if i:
+            f.write("\n")
+        f.write(line)
+
+
 def main():
     """Main function to process DMARC reports."""
     args = parse_args()
@@ -52,33 +118,40 @@ def main():
     
     print(f"Found {len(report_files)} potential DMARC report files...")
     
-    # Process each file
+    cache_dir = None if args.no_cache else get_cache_dir()
+    dns_cache.configure(cache_dir)
+    
+    # Process the files in parallel, reporting results in the original order
     reports = []
-    for filepath in report_files:
-        print(f"Processing {os.path.basename(filepath)}...", end="", flush=True)
-        xml_content = extract_xml_from_file(filepath)
-        if xml_content:
-            report = parse_dmarc_report(xml_content)
+    process_file = partial(_process_report_file,
+                           parse_auth_details=args.verbose or args.html,
+                           safe_xml=args.safe_xml,
+                           cache_dir=cache_dir)
+    jobs = min(args.jobs or os.cpu_count() or 1, len(report_files))
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        if executor:
+            results = executor.map(process_file, report_files, chunksize=8)
+        else:
+            results = map(process_file, report_files)
+        
+        for filepath, (report, status) in zip(report_files, results):
+            print(f"Processing {os.path.basename(filepath)}... {status}", flush=True)
             if report:
-                # Ensure metadata and datetime objects exist for sorting
-                if 'metadata' not in report:
-                    report['metadata'] = {}
-                if 'begin_date_dt' not in report['metadata']:
-                    # Fallback if parsing failed to produce datetime, though it should
-                    report['metadata']['begin_date_dt'] = datetime.min 
                 reports.append(report)
-                print(" OK")
-            else:
-                print(" Failed to parse")
-        else:
-            print(" Failed to extract XML")
+    finally:
+        if executor:
+            executor.shutdown()
+    
+    if cache_dir:
+        prune_cache(cache_dir)
 
     if not reports:
         print("No valid DMARC reports were successfully parsed.", file=sys.stderr)
         sys.exit(1)
 
     # Sort reports by their begin_date_dt
-    reports.sort(key=lambda r: r['metadata'].get('begin_date_dt', datetime.min))
+    reports.sort(key=lambda r: r['metadata']['begin_date_dt'])
     
     # Parse time periods from command line args
     time_periods = args.time_periods
@@ -87,23 +160,25 @@ def main():
     print(f"Analyzing {len(reports)} valid reports for time periods: {', '.join(time_periods)}...")
     stats = analyze_reports(reports, time_periods=time_periods)
     
-    # Generate text report
-    report_content = generate_report(stats, args.verbose, args.resolve_ips)
+    # Both reports include the default period's recommendations; generate them once
+    recommendations = generate_policy_recommendations(stats)
     
-    # Output text report
+    # Generate and output the text report, writing it out as it is produced
     if args.output:
-        with open(args.output, 'w') as f:
-            f.write(report_content)
+        with _open_output(args.output) as f:
+            _write_report(f, iter_report_lines(stats, args.verbose, args.resolve_ips, recommendations))
         print(f"Report written to {args.output}")
     else:
         if not args.html:  # Only print to stdout if not generating HTML
-            print("\n" + report_content)
+            sys.stdout.write("\n")
+            _write_report(sys.stdout, iter_report_lines(stats, args.verbose, args.resolve_ips, recommendations))
+            sys.stdout.write("\n")
     
     # Generate HTML report if requested
     if args.html:
-        html_report = generate_html_report(stats, args.resolve_ips)
+        html_report = generate_html_report(stats, args.resolve_ips, recommendations)
         html_output = args.html_output or "dmarc_report.html"
-        with open(html_output, 'w') as f:
+        with _open_output(html_output) as f:
             f.write(html_report)
         print(f"HTML report written to {html_output}")
 
@@ -5,6 +5,7 @@ This module handles the parsing of DMARC XML reports,
 including extraction from various file formats (XML, gzip, zip).
 """
 
+import io
 import os
 import sys
 import gzip
@@ -19,39 +20,219 @@ except ImportError:
     print("Error: 'defusedxml' library is required. Please install it via pip: pip install defusedxml", file=sys.stderr)
     sys.exit(1)
 
+# lxml is optional; when installed it is used as the faster default parser
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+XML_PARSE_ERRORS = (ET_stdlib.ParseError, DefusedXmlException, EntitiesForbidden, ExternalReferenceForbidden)
+if lxml_etree is not None:
+    XML_PARSE_ERRORS += (lxml_etree.XMLSyntaxError,)
+
 
 def extract_xml_from_file(filepath):
     """
-    Extract XML content from a file, handling different compression formats.
+    Open the XML content of a file, handling different compression formats.
+    
+    Compressed content is decompressed as it is read rather than loaded
+    into memory up front.
     
     Args:
         filepath: Path to the DMARC report file (can be .xml, .gz, or .zip)
         
     Returns:
-        str: The XML content as string, or None if extraction failed
+        A binary file object for the XML content, or None if extraction failed.
+        The caller is responsible for closing it.
     """
     if filepath.endswith('.xml'):
-        with open(filepath, 'r') as f:
-            return f.read()
+        return open(filepath, 'rb')
     elif filepath.endswith('.gz'):
-        with gzip.open(filepath, 'rt') as f:
-            return f.read()
+        return gzip.open(filepath, 'rb')
     elif filepath.endswith('.zip'):
         with zipfile.ZipFile(filepath, 'r') as zip_ref:
             # Assume there's only one XML file in the ZIP
             xml_files = [f for f in zip_ref.namelist() if f.endswith('.xml')]
             if xml_files:
-                with zip_ref.open(xml_files[0]) as f:
-                    return f.read().decode('utf-8')
+                # The member stays readable after the archive itself is closed
+                return zip_ref.open(xml_files[0])
     return None
 
 
-def parse_dmarc_report(xml_content):
+def _intern_text(elem, default, lower=False):
+    """
+    Return the interned text of an element, or a default if it is missing or empty.
+    
+    Domains, IPs and results repeat across many records and reports, so
+    interning lets them share a single string object. Case-insensitive
+    values (domains, policies and results) are lowercased with ``lower``
+    so that consumers can compare them directly.
+    """
+    if elem is None or not elem.text:
+        return default
+    return sys.intern(elem.text.lower() if lower else elem.text)
+
+
+def _parse_report_metadata(metadata_elem):
+    """Extract the fields of a <report_metadata> element."""
+    report_metadata = {}
+    
+    org_name_elem = metadata_elem.find('org_name')
+    report_metadata['org_name'] = _intern_text(org_name_elem, 'Unknown')
+    
+    email_elem = metadata_elem.find('email')
+    report_metadata['email'] = _intern_text(email_elem, 'Unknown')
+    
+    begin_elem = metadata_elem.find('date_range/begin')
+    end_elem = metadata_elem.find('date_range/end')
+    if begin_elem is not None and end_elem is not None:
+        try:
+            begin_timestamp = int(begin_elem.text)
+            end_timestamp = int(end_elem.text)
+        except (TypeError, ValueError):
+            # Leave the date range unset rather than failing the whole report
+            pass
+        else:
+            # Keep the raw POSIX timestamps for cheap comparisons
+            report_metadata['begin_ts'] = begin_timestamp
+            report_metadata['end_ts'] = end_timestamp
+            report_metadata['begin_date_dt'] = datetime.fromtimestamp(begin_timestamp)
+            report_metadata['end_date_dt'] = datetime.fromtimestamp(end_timestamp)
+    
+    return report_metadata
+
+
+def _parse_policy_published(policy_elem):
+    """Extract the fields of a <policy_published> element."""
+    policy_published = {}
+    
+    domain_elem = policy_elem.find('domain')
+    policy_published['domain'] = _intern_text(domain_elem, 'Unknown', lower=True)
+    
+    p_elem = policy_elem.find('p')
+    policy_published['policy'] = _intern_text(p_elem, 'none', lower=True)
+    
+    sp_elem = policy_elem.find('sp')
+    policy_published['subpolicy'] = _intern_text(sp_elem, policy_published['policy'], lower=True)
+    
+    pct_elem = policy_elem.find('pct')
+    policy_published['pct'] = _intern_text(pct_elem, '100')
+    
+    return policy_published
+
+
+def _parse_record(record_elem, parse_auth_details=False):
+    """Extract the fields of a <record> element."""
+    record = {}
+    
+    # Source IP
+    source_ip_elem = record_elem.find('row/source_ip')
+    record['source_ip'] = _intern_text(source_ip_elem, 'Unknown')
+    
+    # Count
+    count_elem = record_elem.find('row/count')
+    record['count'] = int(count_elem.text) if count_elem is not None else 0
+    
+    # Policy evaluated
+    policy_evaluated_elem = record_elem.find('row/policy_evaluated')
+    if policy_evaluated_elem is not None:
+        disposition_elem = policy_evaluated_elem.find('disposition')
+        record['disposition'] = _intern_text(disposition_elem, 'Unknown', lower=True)
+        
+        dkim_elem = policy_evaluated_elem.find('dkim')
+        record['dkim_result'] = _intern_text(dkim_elem, 'Unknown', lower=True)
+        
+        spf_elem = policy_evaluated_elem.find('spf')
+        record['spf_result'] = _intern_text(spf_elem, 'Unknown', lower=True)
+    
+    # Identifiers
+    identifiers_elem = record_elem.find('identifiers')
+    if identifiers_elem is not None:
+        header_from_elem = identifiers_elem.find('header_from')
+        record['header_from'] = _intern_text(header_from_elem, 'Unknown', lower=True)
+    
+    # Auth results (not needed for the aggregate statistics)
+    auth_results_elem = record_elem.find('auth_results') if parse_auth_details else None
+    if auth_results_elem is not None:
+        # DKIM
+        record['dkim_auth'] = []
+        for dkim_elem in auth_results_elem.findall('dkim'):
+            dkim_domain_elem = dkim_elem.find('domain')
+            dkim_result_elem = dkim_elem.find('result')
+            if dkim_domain_elem is not None and dkim_result_elem is not None:
+                record['dkim_auth'].append({
+                    'domain': dkim_domain_elem.text,
+                    'result': dkim_result_elem.text
+                })
+        
+        # SPF
+        record['spf_auth'] = []
+        for spf_elem in auth_results_elem.findall('spf'):
+            spf_domain_elem = spf_elem.find('domain')
+            spf_result_elem = spf_elem.find('result')
+            if spf_domain_elem is not None and spf_result_elem is not None:
+                record['spf_auth'].append({
+                    'domain': spf_domain_elem.text,
+                    'result': spf_result_elem.text
+                })
+    
+    return record
+
+
+def xml_parser_name(safe_xml=False):
+    """Return the name of the XML parser used for report files."""
+    return 'lxml' if lxml_etree is not None and not safe_xml else 'defusedxml'
+
+
+def _iterparse(source, safe_xml=False):
+    """
+    Iterate over the end events of a report document.
+    
+    lxml is used when it is installed, with entity resolution, DTD loading
+    and network access disabled. defusedxml is used otherwise, when
+    ``safe_xml`` is set, and for text streams (which lxml cannot read).
+    """
+    if lxml_etree is not None and not safe_xml and not isinstance(source, io.TextIOBase):
+        return _lxml_iterparse(source)
+    return ET.iterparse(source, events=('end',))
+
+
+def _lxml_iterparse(source):
+    """
+    Iterate over the end events of a report document parsed with lxml.
+    
+    Documents whose DOCTYPE declares internal or external entities are
+    rejected before any element is returned, as defusedxml does. Entities
+    would otherwise be left unresolved and leave elements with no text.
+    An external DTD is never loaded, so a bare DOCTYPE is accepted.
+    """
+    events = lxml_etree.iterparse(source, events=('end',), resolve_entities=False,
+                                  load_dtd=False, no_network=True, huge_tree=False)
+    for event, elem in events:
+        docinfo = elem.getroottree().docinfo
+        dtd = docinfo.internalDTD
+        entity = next(dtd.iterentities(), None) if dtd is not None else None
+        if entity is not None:
+            raise EntitiesForbidden(entity.name, entity.content, None, entity.system_url, None, None)
+        yield event, elem
+        break
+    yield from events
+
+
+def parse_dmarc_report(xml_content, parse_auth_details=False, safe_xml=False):
     """
     Parse DMARC report XML content and extract relevant information.
     
+    The document is parsed incrementally and each <record> element is
+    cleared once it has been processed, so memory use stays flat for
+    reports with many records.
+    
     Args:
-        xml_content: XML content as string
+        xml_content: XML content as a binary file object (as returned by
+            extract_xml_from_file), string or bytes
+        parse_auth_details: Whether to extract the per-record DKIM and SPF
+            <auth_results> into 'dkim_auth' and 'spf_auth'
+        safe_xml: Always parse with defusedxml, even if lxml is available
         
     Returns:
         dict: Structured data extracted from the DMARC report, or None if parsing failed
@@ -59,106 +240,32 @@ def parse_dmarc_report(xml_content):
     if not xml_content:
         return None
     
+    if isinstance(xml_content, str):
+        xml_content = io.StringIO(xml_content)
+    elif isinstance(xml_content, bytes):
+        xml_content = io.BytesIO(xml_content)
+    
     try:
-        root = ET.fromstring(xml_content)
-        
-        # Extract report metadata
         report_metadata = {}
-        metadata_elem = root.find('.//report_metadata')
-        if metadata_elem is not None:
-            org_name_elem = metadata_elem.find('org_name')
-            report_metadata['org_name'] = org_name_elem.text if org_name_elem is not None else 'Unknown'
-            
-            email_elem = metadata_elem.find('email')
-            report_metadata['email'] = email_elem.text if email_elem is not None else 'Unknown'
-            
-            date_range_elem = metadata_elem.find('date_range')
-            if date_range_elem is not None:
-                begin_elem = date_range_elem.find('begin')
-                end_elem = date_range_elem.find('end')
-                if begin_elem is not None and end_elem is not None:
-                    begin_timestamp = int(begin_elem.text)
-                    end_timestamp = int(end_elem.text)
-                    report_metadata['begin_date_dt'] = datetime.fromtimestamp(begin_timestamp)
-                    report_metadata['end_date_dt'] = datetime.fromtimestamp(end_timestamp)
-                    report_metadata['begin_date'] = report_metadata['begin_date_dt'].strftime('%Y-%m-%d %H:%M:%S')
-                    report_metadata['end_date'] = report_metadata['end_date_dt'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Extract policy published
         policy_published = {}
-        policy_elem = root.find('.//policy_published')
-        if policy_elem is not None:
-            domain_elem = policy_elem.find('domain')
-            policy_published['domain'] = domain_elem.text if domain_elem is not None else 'Unknown'
-            
-            p_elem = policy_elem.find('p')
-            policy_published['policy'] = p_elem.text if p_elem is not None else 'none'
-            
-            sp_elem = policy_elem.find('sp')
-            policy_published['subpolicy'] = sp_elem.text if sp_elem is not None else policy_published.get('policy', 'none')
-            
-            pct_elem = policy_elem.find('pct')
-            policy_published['pct'] = pct_elem.text if pct_elem is not None else '100'
-        
-        # Extract records
         records = []
-        for record_elem in root.findall('.//record'):
-            record = {}
-            
-            # Source IP
-            source_ip_elem = record_elem.find('.//source_ip')
-            record['source_ip'] = source_ip_elem.text if source_ip_elem is not None else 'Unknown'
-            
-            # Count
-            count_elem = record_elem.find('.//count')
-            record['count'] = int(count_elem.text) if count_elem is not None else 0
-            
-            # Policy evaluated
-            policy_evaluated_elem = record_elem.find('.//policy_evaluated')
-            if policy_evaluated_elem is not None:
-                disposition_elem = policy_evaluated_elem.find('disposition')
-                record['disposition'] = disposition_elem.text if disposition_elem is not None else 'Unknown'
-                
-                dkim_elem = policy_evaluated_elem.find('dkim')
-                record['dkim_result'] = dkim_elem.text if dkim_elem is not None else 'Unknown'
-                
-                spf_elem = policy_evaluated_elem.find('spf')
-                record['spf_result'] = spf_elem.text if spf_elem is not None else 'Unknown'
-            
-            # Identifiers
-            identifiers_elem = record_elem.find('.//identifiers')
-            if identifiers_elem is not None:
-                header_from_elem = identifiers_elem.find('header_from')
-                record['header_from'] = header_from_elem.text if header_from_elem is not None else 'Unknown'
-            
-            # Auth results
-            auth_results_elem = record_elem.find('.//auth_results')
-            if auth_results_elem is not None:
-                # DKIM
-                dkim_elems = auth_results_elem.findall('.//dkim')
-                record['dkim_auth'] = []
-                for dkim_elem in dkim_elems:
-                    dkim_domain_elem = dkim_elem.find('domain')
-                    dkim_result_elem = dkim_elem.find('result')
-                    if dkim_domain_elem is not None and dkim_result_elem is not None:
-                        record['dkim_auth'].append({
-                            'domain': dkim_domain_elem.text,
-                            'result': dkim_result_elem.text
-                        })
-                
-                # SPF
-                spf_elems = auth_results_elem.findall('.//spf')
-                record['spf_auth'] = []
-                for spf_elem in spf_elems:
-                    spf_domain_elem = spf_elem.find('domain')
-                    spf_result_elem = spf_elem.find('result')
-                    if spf_domain_elem is not None and spf_result_elem is not None:
-                        record['spf_auth'].append({
-                            'domain': spf_domain_elem.text,
-                            'result': spf_result_elem.text
-                        })
-            
-            records.append(record)
+        
+        for _, elem in _iterparse(xml_content, safe_xml):
+            if elem.tag == 'record':
+                records.append(_parse_record(elem, parse_auth_details))
+                elem.clear()
+            elif elem.tag == 'report_metadata':
+                report_metadata = _parse_report_metadata(elem)
+                # A report without a usable date range cannot be placed in any
+                # time period, so don't bother parsing its records
+                if 'begin_date_dt' not in report_metadata:
+                    break
+            elif elem.tag == 'policy_published':
+                policy_published = _parse_policy_published(elem)
+        
+        if 'begin_date_dt' not in report_metadata:
+            print("Error parsing report: missing or invalid date range", file=sys.stderr)
+            return None
         
         return {
             'metadata': report_metadata,
@@ -166,7 +273,7 @@ def parse_dmarc_report(xml_content):
             'records': records
         }
     
-    except (ET_stdlib.ParseError, DefusedXmlException, EntitiesForbidden, ExternalReferenceForbidden) as e:
+    except XML_PARSE_ERRORS as e:
         print(f"Error parsing XML: {e}", file=sys.stderr)
         return None
     except Exception as e:
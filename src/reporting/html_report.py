@@ -4,13 +4,354 @@ HTML Report Generator for DMARC Analyzer
 This module generates an HTML report with visualizations from DMARC analysis results.
 """
 
+import io
+import re
 import html
+import json
+import calendar
 from datetime import datetime
+from functools import lru_cache
 
-from utils.helpers import group_ips_by_source, resolve_ip, get_favicon_url, PROVIDER_ICONS, PROVIDER_DOMAINS
+from utils.helpers import group_ips_by_source, resolve_ip, prewarm_dns, get_favicon_url, PROVIDER_ICONS, PROVIDER_DOMAINS
 from analysis.analyzer import generate_policy_recommendations
 
 
+# Known provider patterns as (lowercased pattern, favicon domain, icon) tuples
+_PROVIDER_PATTERNS = [
+    (pattern.lower(), domain, PROVIDER_ICONS.get(pattern, PROVIDER_ICONS['unknown']))
+    for pattern, domain in PROVIDER_DOMAINS.items()
+]
+
+
+@lru_cache(maxsize=None)
+def _match_provider(org_lower):
+    """
+    Find the first known provider pattern contained in a lowercased org name.
+    
+    Returns:
+        tuple: The provider's favicon domain and icon, or None if nothing matches
+    """
+    for pattern_lower, domain, icon in _PROVIDER_PATTERNS:
+        if pattern_lower in org_lower:
+            return domain, icon
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _org_domain_candidate(org_lower):
+    """
+    Guess a favicon domain from a lowercased org name.
+    
+    Returns:
+        str: The candidate domain, or None if the name doesn't look like one
+    """
+    # Clean up org name and try to extract a domain
+    domain_candidate = org_lower.split()[0].strip(".,;:!?")
+    if "." not in domain_candidate and len(domain_candidate) > 2:  # Avoid single/double letter domains
+        domain_candidate += ".com"  # Assume .com TLD for common names
+    
+    if "." in domain_candidate:  # Only use if it looks like a domain
+        return domain_candidate
+    return None
+
+
+# Templates for the per-source header and per-IP rows, filled with format_map
+_SOURCE_TEMPLATE = """
+        <div class="source">
+            <div class="source-header">
+                <span class="icon">
+                    {icon_html}
+                </span>
+                <span class="name">{name}</span>
+                <span class="stats">
+                    <span class="stat-item">TOTAL</span>
+                    <span class="stat-value">{total}</span>
+                    <span class="stat-item">PASSED SPF</span>
+                    <span class="stat-value">{spf_pass}</span>
+                    <span class="stat-item">PASSED DKIM</span>
+                    <span class="stat-value">{dkim_pass}</span>
+                </span>
+            </div>
+        """
+
+_IP_ROW_TEMPLATE = """
+            <div class="ip-row">
+                <span class="ip">{ip}</span>
+                <span class="stats">
+                    <span class="stat-value">{count}</span>
+                    <span class="stat-value">{spf_pass}</span>
+                    <span class="stat-value">{dkim_pass}</span>
+                </span>
+            </div>
+            """
+
+
+# Static stylesheet for the HTML report; only the default period rule is
+# generated per report
+_CSS_BLOCK = """
+            body {
+                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
+                line-height: 1.6;
+                color: #333;
+                max-width: 800px;
+                margin: 0 auto;
+                padding: 20px;
+                background-color: #f9f9f9;
+            }
+            
+            h1, h2, h3 {
+                font-weight: 500;
+            }
+            
+            a {
+                color: #0366d6;
+                text-decoration: none;
+            }
+            
+            a:hover {
+                text-decoration: underline;
+            }
+            
+            .header {
+                text-align: center;
+                margin-bottom: 10px;
+            }
+            
+            .header h1 {
+                margin-bottom: 5px;
+                font-size: 24px;
+            }
+            
+            .header p {
+                color: #666;
+                margin-top: 0;
+            }
+            
+            /* Tab styles */
+            .tabs {
+                display: flex;
+                border-bottom: 1px solid #ddd;
+                margin-bottom: 20px;
+                overflow-x: auto;
+                white-space: nowrap;
+            }
+            
+            .tab-button {
+                background-color: transparent;
+                border: none;
+                outline: none;
+                cursor: pointer;
+                padding: 10px 15px;
+                margin-right: 5px;
+                font-size: 14px;
+                color: #586069;
+                border-bottom: 2px solid transparent;
+            }
+            
+            .tab-button:hover {
+                color: #0366d6;
+            }
+            
+            .tab-button.active {
+                color: #0366d6;
+                border-bottom-color: #0366d6;
+            }
+            
+            .period-content {
+                display: none;
+            }
+            
+            .summary-box {
+                display: flex;
+                justify-content: space-between;
+                border: 1px solid #e1e4e8;
+                border-radius: 6px;
+                margin-bottom: 30px;
+                background-color: white;
+                overflow: hidden;
+            }
+            
+            .summary-item {
+                text-align: center;
+                flex: 1;
+                padding: 15px 10px;
+                border-right: 1px solid #e1e4e8;
+            }
+            
+            .summary-item:last-child {
+                border-right: none;
+            }
+            
+            .summary-number {
+                font-size: 32px;
+                font-weight: 300;
+                margin: 10px 0;
+                line-height: 1;
+            }
+            
+            .success { color: #6BCB77; }
+            .failure { color: #FF6B6B; }
+            .neutral { color: #70B7FF; }
+            
+            .section {
+                margin-bottom: 40px;
+                border-top: 1px solid #e1e4e8;
+                padding-top: 20px;
+            }
+            
+            .source {
+                margin-bottom: 15px;
+                background-color: white;
+                border: 1px solid #e1e4e8;
+                border-radius: 6px;
+                overflow: hidden;
+            }
+            
+            .source-header {
+                display: flex;
+                align-items: center;
+                padding: 12px 15px;
+                background-color: #f6f8fa;
+                border-bottom: 1px solid #e1e4e8;
+            }
+            
+            .icon {
+                margin-right: 8px;
+                font-size: 16px;
+                display: flex;
+                align-items: center;
+                width: 16px;
+                height: 16px;
+            }
+            
+            .favicon {
+                width: 16px;
+                height: 16px;
+                object-fit: contain;
+            }
+            
+            .domain-favicon {
+                width: 24px;
+                height: 24px;
+                object-fit: contain;
+                margin-right: 5px;
+                vertical-align: middle;
+            }
+            
+            .name {
+                flex-grow: 1;
+                font-weight: 600;
+            }
+            
+            .stats {
+                display: grid;
+                grid-template-columns: repeat(6, 90px);
+                column-gap: 10px;
+                align-items: center;
+                margin: 0 5px;
+            }
+            
+            .stat-item {
+                color: #6a737d;
+                font-size: 12px;
+                text-transform: uppercase;
+                text-align: center;
+            }
+            
+            .stat-value {
+                width: 90px;
+                text-align: center;
+            }
+            
+            /* IP rows have no labels, so line each value up under the header's value column */
+            .ip-row .stat-value {
+                grid-column: span 2;
+                justify-self: end;
+            }
+            
+            .ip-row {
+                display: flex;
+                padding: 10px 15px;
+                border-bottom: 1px solid #e1e4e8;
+            }
+            
+            .ip-row:last-child {
+                border-bottom: none;
+            }
+            
+            .ip {
+                flex-grow: 1;
+                font-family: monospace;
+            }
+            
+            .warning-box {
+                background-color: #FFF9C4;
+                border-left: 4px solid #FBC02D;
+                padding: 15px;
+                margin: 15px 0;
+                border-radius: 3px;
+            }
+            
+            .help-links {
+                list-style-type: none;
+                padding-left: 5px;
+                margin: 20px 0;
+            }
+            
+            .help-links li {
+                margin-bottom: 8px;
+            }
+            
+            .more-ips {
+                padding: 8px 15px;
+                font-size: 13px;
+                color: #6a737d;
+                text-align: center;
+                background-color: #f6f8fa;
+                border-top: 1px solid #e1e4e8;
+            }
+            
+            .recommendations {
+                background-color: #f6f8fa;
+                padding: 15px;
+                border-radius: 6px;
+                border: 1px solid #e1e4e8;
+            }
+            
+            .recommendations ul {
+                margin: 0;
+                padding-left: 20px;
+            }
+            
+            .footer {
+                text-align: center;
+                margin-top: 40px;
+                color: #6a737d;
+                font-size: 14px;
+            }
+"""
+
+
+# Abbreviated month names indexed by month number, as formatted by strftime('%b')
+_MONTH_ABBR = tuple(calendar.month_abbr)
+
+# Recommendations that are not listed in the HTML report
+_SKIPPED_RECOMMENDATION_PREFIXES = ("INFO:", "CRITICAL", "CAUTION")
+
+# Characters that html.escape would replace
+_HTML_SPECIAL_CHARS = re.compile(r'[&<>"\']')
+
+
+def _escape_html(text):
+    """Escape ``text`` like html.escape, returning it unchanged when there is nothing to escape."""
+    return html.escape(text) if _HTML_SPECIAL_CHARS.search(text) else text
+
+
+def _percent(part, total):
+    """Return ``part`` as a whole percentage of ``total`` (rounded down), or 0 if ``total`` is 0."""
+    return part * 100 // total if total else 0
+
+
 def source_icon_html(source):
     """Generate the HTML for a source icon."""
     # If a favicon is already set, use it
@@ -33,84 +374,96 @@ def source_icon_html(source):
     return source["icon"]
 
 
-def generate_source_section(title, description, sources):
-    """Generate HTML for a sources section."""
-    if not sources:
-        return f"""
+def _source_section_renderer(title, description, footer=""):
+    """
+    Build a renderer for a sources section with a fixed title, description and footer.
+    
+    The static HTML around the sources is formatted once here, so rendering a
+    section for each period only has to fill in the sources themselves.
+    
+    Args:
+        title: Section heading
+        description: Paragraph shown below the heading
+        footer: Extra HTML shown below the sources, if there are any
+        
+    Returns:
+        function: Takes a list of source entries and returns the section HTML
+    """
+    empty_html = f"""
         <div class="section">
             <h2>{title}</h2>
             <p>{description}</p>
             <p>No sources found in this category.</p>
         </div>
         """
-    
-    html_content = f"""
+    head_html = f"""
     <div class="section">
         <h2>{title}</h2>
         <p>{description}</p>
     """
+    tail_html = footer + """
+    </div>
+    """
     
-    # Generate HTML for each source
-    for source in sources:
-        html_content += f"""
-        <div class="source">
-            <div class="source-header">
-                <span class="icon">
-                    {source_icon_html(source)}
-                </span>
-                <span class="name">{source['name']}</span>
-                <span class="stats">
-                    <span class="stat-item">TOTAL</span>
-                    <span class="stat-value">{source['total']}</span>
-                    <span class="stat-item">PASSED SPF</span>
-                    <span class="stat-value">{source['spf_pass']}</span>
-                    <span class="stat-item">PASSED DKIM</span>
-                    <span class="stat-value">{source['dkim_pass']}</span>
-                </span>
-            </div>
-        """
+    def render(sources):
+        if not sources:
+            return empty_html
         
-        # Add IPs for this source
-        for ip_entry in source['ips']:
-            html_content += f"""
-            <div class="ip-row">
-                <span class="ip">{ip_entry['ip']}</span>
-                <span class="stats">
-                    <span class="stat-placeholder"></span><span class="stat-value">{ip_entry['count']}</span>
-                    <span class="stat-placeholder"></span><span class="stat-value">{ip_entry['spf_pass']}</span>
-                    <span class="stat-placeholder"></span><span class="stat-value">{ip_entry['dkim_pass']}</span>
-                </span>
-            </div>
-            """
+        parts = [head_html]
         
-        html_content += """
+        # Generate HTML for each source
+        for source in sources:
+            parts.append(_SOURCE_TEMPLATE.format_map({**source, 'icon_html': source_icon_html(source)}))
+            
+            # Add IPs for this source
+            parts.extend(_IP_ROW_TEMPLATE.format_map(ip_entry) for ip_entry in source['ips'])
+            
+            parts.append("""
         </div>
-        """
+        """)
+        
+        parts.append(tail_html)
+        return "".join(parts)
     
-    # Add helper links for specific sections
-    if title == "Other sources":
-        html_content += """
+    return render
+
+
+_render_verified_sources = _source_section_renderer(
+    "Authenticated sources",
+    "These are sources that were identified as legitimate senders for your domain based on authentication results."
+)
+
+_render_other_sources = _source_section_renderer(
+    "Unauthenticated sources",
+    "These sources are sending emails from your domain, but could not be verified through authentication.",
+    """
         <ul class="help-links">
             <li>For SPF: Configure TXT records with authorized senders</li>
             <li>For DKIM: Set up signing keys for all sending services</li>
         </ul>
         """
-    elif title == "Forwarded email sources":
-        html_content += """
+)
+
+_render_forwarded_sources = _source_section_renderer(
+    "Forwarded email sources",
+    "These sources appear to be forwarded emails. Forwarded emails often preserve DKIM signatures while failing SPF alignment.",
+    """
         <p>Email forwarding typically preserves DKIM headers but originates from new IP addresses not in your SPF record.</p>
         """
-    
-    html_content += """
-    </div>
-    """
-    return html_content
+)
 
 
-def generate_period_content(period_key, stats_bundle):
-    """Generate HTML content for a specific time period."""
+def generate_period_content(period_key, stats_bundle, source_cache=None, recommendations=None):
+    """
+    Generate HTML content for a specific time period.
+    
+    ``source_cache`` is passed on to group_ips_by_source so that IP sources
+    identified for one period are reused by the others. ``recommendations``
+    may hold the period's already generated policy recommendations.
+    """
     period_data = stats_bundle['periods'][period_key]
     display_stats = period_data['stats']
-    days = period_data.get('days')
+    days = period_data['days']
     
     # Calculate summary stats for this period
     total_messages = display_stats['total_messages']
@@ -119,16 +472,12 @@ def generate_period_content(period_key, stats_bundle):
     spf_pass = display_stats['spf_overall']['pass']
     spf_fail = display_stats['spf_overall']['fail']
     
-    # Count emails that passed either SPF or DKIM
-    passed_either = 0
-    failed_both = 0
+    # Emails that passed either SPF or DKIM (DMARC pass) and those that failed both
+    passed_either = display_stats['dmarc_overall']['pass']
+    failed_both = display_stats['dmarc_overall']['fail']
     
-    for ip, ip_stats in display_stats['ips'].items():
-        passed_either += ip_stats['fully_aligned']  # Messages that passed DMARC
-        failed_both += ip_stats['count'] - ip_stats['fully_aligned']  # Messages that failed DMARC
-    
-    # Get the primary domain (first in sorted list)
-    domain_name = sorted(display_stats['domains'])[0] if display_stats['domains'] else "Domain"
+    # Get the primary domain (alphabetically first)
+    domain_name = min(display_stats['domains']) if display_stats['domains'] else "Domain"
     
     # Format date range from the DMARC reports
     if display_stats['date_range']['begin'] and display_stats['date_range']['end']:
@@ -137,15 +486,15 @@ def generate_period_content(period_key, stats_bundle):
         
         # Format like "May 15 - May 22"
         if begin_date.month == end_date.month:
-            date_range = f"{begin_date.strftime('%b')} {begin_date.day} - {end_date.day}"
+            date_range = f"{_MONTH_ABBR[begin_date.month]} {begin_date.day} - {end_date.day}"
         else:
-            date_range = f"{begin_date.strftime('%b')} {begin_date.day} - {end_date.strftime('%b')} {end_date.day}"
+            date_range = f"{_MONTH_ABBR[begin_date.month]} {begin_date.day} - {_MONTH_ABBR[end_date.month]} {end_date.day}"
     else:
         # Fallback to current date if no date range found
         date_range = datetime.now().strftime("%b %d - %b %d")  # e.g., "May 15 - May 22"
     
     # Group IPs by source
-    ip_groups = group_ips_by_source(display_stats['ips'], resolve=True)
+    ip_groups = group_ips_by_source(display_stats['ips'], resolve=True, source_cache=source_cache)
     
     # Process and categorize sources
     verified_sources = []
@@ -155,36 +504,33 @@ def generate_period_content(period_key, stats_bundle):
     # First group IPs by their organizations
     for org_name, group_stats in sorted(ip_groups.items(), key=lambda x: x[1]['count'], reverse=True):
         # Calculate rates
-        dkim_pass_pct = int((group_stats['dkim_pass'] / group_stats['count']) * 100) if group_stats['count'] else 0
-        spf_pass_pct = int((group_stats['spf_pass'] / group_stats['count']) * 100) if group_stats['count'] else 0
+        dkim_pass_pct = _percent(group_stats['dkim_pass'], group_stats['count'])
+        spf_pass_pct = _percent(group_stats['spf_pass'], group_stats['count'])
         
         # Determine icon for this organization
-        icon = PROVIDER_ICONS.get('unknown')
+        icon = PROVIDER_ICONS['unknown']
         favicon = None
         
-        # First try to match known providers
-        for pattern, domain in PROVIDER_DOMAINS.items():
-            if pattern.lower() in org_name.lower():
-                # Set icon based on pattern if available
-                if pattern in PROVIDER_ICONS:
-                    icon = PROVIDER_ICONS[pattern]
+        # Unresolved sources never match a provider or have a favicon
+        if org_name != "Unknown":
+            org_lower = org_name.lower()
+            
+            # First try to match known providers
+            provider = _match_provider(org_lower)
+            if provider:
+                domain, icon = provider
                 # Get favicon for this pattern
                 favicon = get_favicon_url(domain)
-                break
-        
-        # If no favicon yet, try to extract domain from org name
-        if not favicon and org_name != "Unknown":
-            # Clean up org name and try to extract a domain
-            domain_candidate = org_name.lower().split()[0].strip(".,;:!?")
-            if "." not in domain_candidate and len(domain_candidate) > 2:  # Avoid single/double letter domains
-                domain_candidate += ".com"  # Assume .com TLD for common names
-            
-            if "." in domain_candidate:  # Only use if it looks like a domain
-                favicon = get_favicon_url(domain_candidate)
+            
+            # If no favicon yet, try to extract domain from org name
+            if not favicon:
+                domain_candidate = _org_domain_candidate(org_lower)
+                if domain_candidate:
+                    favicon = get_favicon_url(domain_candidate)
         
         # Create source entry with all IPs
         source_entry = {
-            'name': html.escape(org_name),
+            'name': _escape_html(org_name),
             'icon': icon,
             'favicon': favicon,
             'total': group_stats['count'],
@@ -196,11 +542,11 @@ def generate_period_content(period_key, stats_bundle):
         # Add individual IPs
         for ip in group_stats['ips']:
             ip_stats = display_stats['ips'][ip]
-            ip_dkim_pct = int((ip_stats['dkim_pass'] / ip_stats['count']) * 100) if ip_stats['count'] else 0
-            ip_spf_pct = int((ip_stats['spf_pass'] / ip_stats['count']) * 100) if ip_stats['count'] else 0
+            ip_dkim_pct = _percent(ip_stats['dkim_pass'], ip_stats['count'])
+            ip_spf_pct = _percent(ip_stats['spf_pass'], ip_stats['count'])
             
             source_entry['ips'].append({
-                'ip': html.escape(ip),
+                'ip': _escape_html(ip),
                 'count': ip_stats['count'],
                 'dkim_pass': f"{ip_dkim_pct}%",
                 'spf_pass': f"{ip_spf_pct}%"
@@ -215,23 +561,22 @@ def generate_period_content(period_key, stats_bundle):
             other_sources.append(source_entry)
     
     # Generate recommendations specific to this period
-    recommendations_html = ""
-    all_recommendations = set()
-    policy_recommendations = generate_policy_recommendations(stats_bundle, period_key)
-    
-    for policy_rec in policy_recommendations:
-        for rec in policy_rec['recommendations']:
-            if rec.startswith("INFO:"):
-                continue  # Skip the INFO prefix recommendations
-            if not rec.startswith("CRITICAL") and not rec.startswith("CAUTION"):
-                all_recommendations.add(rec.split(": ", 1)[1] if ": " in rec else rec)
+    # (skipping informational and warning ones and dropping "LABEL: " prefixes)
+    policy_recommendations = recommendations
+    if policy_recommendations is None:
+        policy_recommendations = generate_policy_recommendations(stats_bundle, period_key)
+    all_recommendations = {
+        rec.partition(": ")[2] if ": " in rec else rec
+        for policy_rec in policy_recommendations
+        for rec in policy_rec['recommendations']
+        if not rec.startswith(_SKIPPED_RECOMMENDATION_PREFIXES)
+    }
     
     if not all_recommendations:
         all_recommendations = ["Set up SPF and DKIM for all sending sources.",
                               "Configure a DMARC policy for better email deliverability."]
     
-    for rec in all_recommendations:
-        recommendations_html += f"<li>{html.escape(rec)}</li>"
+    recommendations_html = "".join(f"<li>{html.escape(rec)}</li>" for rec in all_recommendations)
     
     # Map period keys to display names
     period_display_names = {
@@ -259,23 +604,11 @@ def generate_period_content(period_key, stats_bundle):
         </div>
     </div>
     
-    {generate_source_section(
-        "Authenticated sources",
-        "These are sources that were identified as legitimate senders for your domain based on authentication results.",
-        verified_sources
-    )}
+    {_render_verified_sources(verified_sources)}
     
-    {generate_source_section(
-        "Unauthenticated sources",
-        "These sources are sending emails from your domain, but could not be verified through authentication.",
-        other_sources
-    )}
+    {_render_other_sources(other_sources)}
     
-    {generate_source_section(
-        "Forwarded email sources",
-        "These sources appear to be forwarded emails. Forwarded emails often preserve DKIM signatures while failing SPF alignment.",
-        forwarded_sources
-    )}
+    {_render_forwarded_sources(forwarded_sources)}
     
     <div class="section recommendations">
         <h2>Recommendations for {period_display_names.get(period_key, period_key)}</h2>
@@ -284,16 +617,18 @@ def generate_period_content(period_key, stats_bundle):
         </ul>
     </div>
     '''
-    return period_html, date_range, html.escape(domain_name)
+    return period_html, date_range, _escape_html(domain_name)
 
 
-def generate_html_report(stats, resolve_ips=False):
+def generate_html_report(stats, resolve_ips=False, recommendations=None):
     """
     Generate an HTML report with visualizations from DMARC analysis results.
     
     Args:
         stats: Dictionary with analyzed DMARC statistics
         resolve_ips: Whether to resolve IP addresses to hostnames (not used directly in this implementation)
+        recommendations: Policy recommendations for the bundle's default period,
+            if already generated
         
     Returns:
         str: Formatted HTML report
@@ -301,8 +636,8 @@ def generate_html_report(stats, resolve_ips=False):
     stats_bundle = stats  # stats is now the bundle
     
     # Get available periods
-    available_periods = list(stats_bundle.get('periods', {}).keys())
-    default_period = stats_bundle.get('default_period', 'all')
+    available_periods = list(stats_bundle['periods'].keys())
+    default_period = stats_bundle['default_period']
     
     # Map period keys to display names
     period_display_names = {
@@ -330,40 +665,42 @@ def generate_html_report(stats, resolve_ips=False):
         default_period = meaningful_periods[0] if meaningful_periods else 'all'
     
     # Generate content for all periods
-    period_contents = {}
     main_date_range = ""
     main_domain_name = ""
     date_ranges = {}  # Store date ranges for each period
+    source_cache = {}  # IP -> source organization, shared by all periods
+    
+    # Resolve every IP shown in any period once, concurrently, before building the periods
+    prewarm_dns({ip for period in meaningful_periods for ip in stats_bundle['periods'][period]['stats']['ips']})
+    
+    results = [generate_period_content(period, stats_bundle, source_cache,
+                                       recommendations if period == stats_bundle['default_period'] else None)
+               for period in meaningful_periods]
     
-    for period in meaningful_periods:
-        period_html, date_range, domain_name = generate_period_content(period, stats_bundle)
-        period_contents[period] = period_html
+    # Build the tab navigation and the period content in a single pass
+    tab_parts = ['<div class="tabs">']
+    period_parts = []
+    for period, (period_html, date_range, domain_name) in zip(meaningful_periods, results):
         date_ranges[period] = date_range  # Store the date range for this period
         if period == default_period:
             main_date_range = date_range
             main_domain_name = domain_name
-    
-    # Generate tab navigation HTML
-    tabs_html = '<div class="tabs">'
-    for period in meaningful_periods:
-        active_class = 'active' if period == default_period else ''
+            active_class = 'active'
+            display_style = 'block'
+        else:
+            active_class = ''
+            display_style = 'none'
+        
         period_name = period_display_names.get(period, period)
-        tabs_html += f'<button class="tab-button {active_class}" onclick="showPeriod(\'{period}\')">{period_name}</button>'
-    tabs_html += '</div>'
-    
-    # Generate all period content HTML
-    period_content_html = ''
-    for period in meaningful_periods:
-        display_style = 'block' if period == default_period else 'none'
-        period_content_html += f'<div id="period-{period}" class="period-content" style="display: {display_style}">'
-        period_content_html += period_contents[period]
-        period_content_html += '</div>'
-    
-    # Create a JavaScript object with date ranges for each period
-    js_date_ranges = "{"
-    for period in meaningful_periods:
-        js_date_ranges += f"'{period}': '{date_ranges[period]}',"
-    js_date_ranges = js_date_ranges.rstrip(",") + "}"
+        tab_parts.append(f'<button class="tab-button {active_class}" onclick="showPeriod(\'{period}\')">{period_name}</button>')
+        period_parts.append(f'<div id="period-{period}" class="period-content" style="display: {display_style}">')
+        period_parts.append(period_html)
+        period_parts.append('</div>')
+    tab_parts.append('</div>')
+    
+    # Create a JavaScript object with date ranges for each period, escaping
+    # "</" so that no value can close the surrounding script element
+    js_date_ranges = json.dumps(date_ranges).replace("</", "<\\/")
     
     # JavaScript for tab switching with date range update
     tab_javascript = f'''
@@ -392,14 +729,16 @@ def generate_html_report(stats, resolve_ips=False):
         
         // Update the date range in the header
         if (periodDateRanges[periodId]) {{
-            document.getElementById("date-range-display").innerHTML = periodDateRanges[periodId];
+            document.getElementById("date-range-display").textContent = periodDateRanges[periodId];
         }}
     }}
     </script>
     '''
     
-    # Construct the HTML
-    html_content = f"""
+    # Write the document once into a single buffer rather than joining the
+    # (potentially large) period content into intermediate strings first
+    buf = io.StringIO()
+    buf.write(f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -407,250 +746,10 @@ def generate_html_report(stats, resolve_ips=False):
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <style>
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                background-color: #f9f9f9;
-            }}
-            
-            h1, h2, h3 {{
-                font-weight: 500;
-            }}
-            
-            a {{
-                color: #0366d6;
-                text-decoration: none;
-            }}
-            
-            a:hover {{
-                text-decoration: underline;
-            }}
-            
-            .header {{
-                text-align: center;
-                margin-bottom: 10px;
-            }}
-            
-            .header h1 {{
-                margin-bottom: 5px;
-                font-size: 24px;
-            }}
-            
-            .header p {{
-                color: #666;
-                margin-top: 0;
-            }}
-            
-            /* Tab styles */
-            .tabs {{
-                display: flex;
-                border-bottom: 1px solid #ddd;
-                margin-bottom: 20px;
-                overflow-x: auto;
-                white-space: nowrap;
-            }}
-            
-            .tab-button {{
-                background-color: transparent;
-                border: none;
-                outline: none;
-                cursor: pointer;
-                padding: 10px 15px;
-                margin-right: 5px;
-                font-size: 14px;
-                color: #586069;
-                border-bottom: 2px solid transparent;
-            }}
-            
-            .tab-button:hover {{
-                color: #0366d6;
-            }}
-            
-            .tab-button.active {{
-                color: #0366d6;
-                border-bottom-color: #0366d6;
-            }}
-            
-            .period-content {{
-                display: none;
-            }}
-            
+{_CSS_BLOCK}
             #period-{default_period} {{
                 display: block;
             }}
-            
-            .summary-box {{
-                display: flex;
-                justify-content: space-between;
-                border: 1px solid #e1e4e8;
-                border-radius: 6px;
-                margin-bottom: 30px;
-                background-color: white;
-                overflow: hidden;
-            }}
-            
-            .summary-item {{
-                text-align: center;
-                flex: 1;
-                padding: 15px 10px;
-                border-right: 1px solid #e1e4e8;
-            }}
-            
-            .summary-item:last-child {{
-                border-right: none;
-            }}
-            
-            .summary-number {{
-                font-size: 32px;
-                font-weight: 300;
-                margin: 10px 0;
-                line-height: 1;
-            }}
-            
-            .success {{ color: #6BCB77; }}
-            .failure {{ color: #FF6B6B; }}
-            .neutral {{ color: #70B7FF; }}
-            
-            .section {{
-                margin-bottom: 40px;
-                border-top: 1px solid #e1e4e8;
-                padding-top: 20px;
-            }}
-            
-            .source {{
-                margin-bottom: 15px;
-                background-color: white;
-                border: 1px solid #e1e4e8;
-                border-radius: 6px;
-                overflow: hidden;
-            }}
-            
-            .source-header {{
-                display: flex;
-                align-items: center;
-                padding: 12px 15px;
-                background-color: #f6f8fa;
-                border-bottom: 1px solid #e1e4e8;
-            }}
-            
-            .icon {{
-                margin-right: 8px;
-                font-size: 16px;
-                display: flex;
-                align-items: center;
-                width: 16px;
-                height: 16px;
-            }}
-            
-            .favicon {{
-                width: 16px;
-                height: 16px;
-                object-fit: contain;
-            }}
-            
-            .domain-favicon {{
-                width: 24px;
-                height: 24px;
-                object-fit: contain;
-                margin-right: 5px;
-                vertical-align: middle;
-            }}
-            
-            .name {{
-                flex-grow: 1;
-                font-weight: 600;
-            }}
-            
-            .stats {{
-                display: flex;
-                align-items: center;
-            }}
-            
-            .stat-item {{
-                color: #6a737d;
-                font-size: 12px;
-                text-transform: uppercase;
-                margin: 0 5px;
-                width: 90px;
-                text-align: center;
-            }}
-            
-            .stat-value {{
-                margin: 0 5px;
-                width: 90px;
-                text-align: center;
-            }}
-            
-            .stat-placeholder {{
-                width: 90px;
-                margin: 0 5px;
-                /* This class is for spacing, content is not needed */
-            }}
-            
-            .ip-row {{
-                display: flex;
-                padding: 10px 15px;
-                border-bottom: 1px solid #e1e4e8;
-            }}
-            
-            .ip-row:last-child {{
-                border-bottom: none;
-            }}
-            
-            .ip {{
-                flex-grow: 1;
-                font-family: monospace;
-            }}
-            
-            .warning-box {{
-                background-color: #FFF9C4;
-                border-left: 4px solid #FBC02D;
-                padding: 15px;
-                margin: 15px 0;
-                border-radius: 3px;
-            }}
-            
-            .help-links {{
-                list-style-type: none;
-                padding-left: 5px;
-                margin: 20px 0;
-            }}
-            
-            .help-links li {{
-                margin-bottom: 8px;
-            }}
-            
-            .more-ips {{
-                padding: 8px 15px;
-                font-size: 13px;
-                color: #6a737d;
-                text-align: center;
-                background-color: #f6f8fa;
-                border-top: 1px solid #e1e4e8;
-            }}
-            
-            .recommendations {{
-                background-color: #f6f8fa;
-                padding: 15px;
-                border-radius: 6px;
-                border: 1px solid #e1e4e8;
-            }}
-            
-            .recommendations ul {{
-                margin: 0;
-                padding-left: 20px;
-            }}
-            
-            .footer {{
-                text-align: center;
-                margin-top: 40px;
-                color: #6a737d;
-                font-size: 14px;
-            }}
         </style>
     </head>
     <body>
@@ -659,13 +758,19 @@ def generate_html_report(stats, resolve_ips=False):
             <p id="date-range-display">{main_date_range}</p>
         </div>
         
-        {tabs_html}
+        """)
+    buf.writelines(tab_parts)
+    buf.write("""
         
-        {period_content_html}
+        """)
+    buf.writelines(period_parts)
+    buf.write("""
         
-        {tab_javascript}
+        """)
+    buf.write(tab_javascript)
+    buf.write("""
     </body>
     </html>
-    """
+    """)
     
-    return html_content
+    return buf.getvalue()
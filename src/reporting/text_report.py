@@ -4,13 +4,81 @@ Text Report Generator for DMARC Analyzer
 This module generates a human-readable text report from DMARC analysis results.
 """
 
-from tabulate import tabulate
+import heapq
+from functools import lru_cache
 
-from utils.helpers import group_ips_by_source, resolve_ip
+from utils.helpers import group_ips_by_source, resolve_ip, prewarm_dns
 from analysis.analyzer import generate_policy_recommendations
 
 
-def generate_report(stats, verbose=False, resolve_ips=False):
+# Static DMARC policy reference guide appended to every report
+_POLICY_REFERENCE_GUIDE = (
+    "\n= DMARC Policy Reference Guide =",
+    "Policy Values (p=):",
+    "  none - Monitor only, take no action on failures (monitoring mode)",
+    "  quarantine - Mark or junk messages that fail authentication",
+    "  reject - Block messages that fail authentication",
+    "\nPercentage (pct=):",
+    "  Controls what percentage of messages are subject to filtering",
+    "  Start low (5-10%) and gradually increase as confidence grows",
+    "\nSubdomain Policy (sp=):",
+    "  Controls policy for subdomains (e.g., mail from sub.example.com when domain is example.com)",
+    "  Often set to 'reject' to prevent subdomain spoofing",
+    "\nDMARC Policy Progression Path:",
+    "  1. p=none with RUA/RUF reporting enabled",
+    "  2. p=quarantine with low pct value (5-25%)",
+    "  3. Gradually increase pct value to 100%",
+    "  4. p=reject with low pct value (5-25%)",
+    "  5. Gradually increase pct value to 100%",
+)
+
+
+# General implementation tips that apply to every report
+_GENERAL_TIPS = (
+    "- Implement proper SPF, DKIM and DMARC for all domains, even non-sending domains",
+    "- Monitor reports regularly and adjust policies based on findings",
+    "- Coordinate with third-party senders to ensure they authenticate properly",
+    "- Consider using multiple DKIM selectors for different mail streams",
+    "- Implement a process to respond to authentication failures quickly",
+)
+
+
+@lru_cache(maxsize=4096)
+def _format_percent(part, total):
+    """Format ``part`` as a percentage of ``total`` with one decimal place, or 0.0% if ``total`` is 0."""
+    return f"{(part / total) * 100:.1f}%" if total > 0 else "0.0%"
+
+
+def _format_table(rows, headers):
+    """
+    Format rows as a plain-text table with a dashed line under the headers.
+    
+    Integer columns are right-aligned and all other columns left-aligned, with
+    two spaces between columns, matching tabulate's "simple" format.
+    
+    Args:
+        rows: List of rows, each a list of cell values
+        headers: Column headers
+        
+    Returns:
+        str: The formatted table
+    """
+    numeric = [bool(rows) and all(isinstance(row[i], int) for row in rows) for i in range(len(headers))]
+    cells = [[str(value).strip() for value in row] for row in rows]
+    widths = [max([len(header) + 2] + [len(row[i]) for row in cells]) for i, header in enumerate(headers)]
+    
+    def format_line(values):
+        return "  ".join(
+            value.rjust(width) if is_numeric else value.ljust(width)
+            for value, width, is_numeric in zip(values, widths, numeric)
+        ).rstrip()
+    
+    lines = [format_line(headers), "  ".join("-" * width for width in widths)]
+    lines.extend(format_line(row) for row in cells)
+    return "\n".join(lines)
+
+
+def generate_report(stats, verbose=False, resolve_ips=False, recommendations=None):
     """
     Generate a human-readable report from the analyzed statistics.
     
@@ -18,29 +86,55 @@ def generate_report(stats, verbose=False, resolve_ips=False):
         stats: Dictionary with analyzed DMARC statistics
         verbose: Whether to include detailed IP information
         resolve_ips: Whether to resolve IP addresses to hostnames
+        recommendations: Policy recommendations for the default period, if
+            already generated
         
     Returns:
         str: Formatted text report
     """
+    return "\n".join(iter_report_lines(stats, verbose, resolve_ips, recommendations))
+
+
+def iter_report_lines(stats, verbose=False, resolve_ips=False, recommendations=None):
+    """
+    Generate the text report piece by piece.
+    
+    Pieces are produced as each section is built, so the report can be
+    written out without holding all of it in memory. Joining them with
+    newlines gives the same text as generate_report.
+    
+    Args:
+        stats: Dictionary with analyzed DMARC statistics
+        verbose: Whether to include detailed IP information
+        resolve_ips: Whether to resolve IP addresses to hostnames
+        recommendations: Policy recommendations for the default period, if
+            already generated
+        
+    Yields:
+        str: A line or block of lines (such as a table), without a trailing newline
+    """
     # Decide which stats to use for the report
     stats_bundle = stats  # stats is now the bundle
     display_stats = stats_bundle['periods'][stats_bundle['default_period']]['stats']
-    report_period_info = f" (Recent Period)" if stats_bundle['periods'][stats_bundle['default_period']]['is_meaningful'] else " (Overall Period)"
+    report_period_info = " (Recent Period)" if stats_bundle['periods'][stats_bundle['default_period']]['is_meaningful'] else " (Overall Period)"
 
     if not display_stats['total_messages']:
-        return "No valid DMARC reports found or no messages reported for the analyzed period."
+        yield "No valid DMARC reports found or no messages reported for the analyzed period."
+        return
     
-    report_lines = []
+    # Resolve all IPs up front so the lookups below don't wait on DNS one at a time
+    if resolve_ips:
+        prewarm_dns(display_stats['ips'])
     
     # Summary section
-    report_lines.append("= DMARC Report Summary" + report_period_info + " =")
-    report_lines.append(f"Total Messages: {display_stats['total_messages']}")
-    report_lines.append(f"Domains Protected: {', '.join(sorted(display_stats['domains']))}")
-    report_lines.append(f"Reporting Organizations: {', '.join(sorted(display_stats['reporting_orgs']))}")
-    report_lines.append("")
+    yield f"= DMARC Report Summary{report_period_info} ="
+    yield f"Total Messages: {display_stats['total_messages']}"
+    yield f"Domains Protected: {', '.join(sorted(display_stats['domains']))}"
+    yield f"Reporting Organizations: {', '.join(sorted(display_stats['reporting_orgs']))}"
+    yield ""
     
     # Authentication Summary
-    report_lines.append("= Authentication Summary" + report_period_info + " =")
+    yield f"= Authentication Summary{report_period_info} ="
     dkim_pass = display_stats['dkim_overall']['pass']
     dkim_fail = display_stats['dkim_overall']['fail']
     dkim_total = dkim_pass + dkim_fail
@@ -51,21 +145,20 @@ def generate_report(stats, verbose=False, resolve_ips=False):
     spf_total = spf_pass + spf_fail
     spf_pass_pct = (spf_pass / spf_total) * 100 if spf_total else 0
     
-    report_lines.append(f"DKIM: {dkim_pass}/{dkim_total} passed ({dkim_pass_pct:.1f}%)")
-    report_lines.append(f"SPF: {spf_pass}/{spf_total} passed ({spf_pass_pct:.1f}%)")
-    report_lines.append("")
+    yield f"DKIM: {dkim_pass}/{dkim_total} passed ({dkim_pass_pct:.1f}%)"
+    yield f"SPF: {spf_pass}/{spf_total} passed ({spf_pass_pct:.1f}%)"
+    yield ""
     
     # Disposition Summary
-    report_lines.append("= Policy Enforcement" + report_period_info + " =")
+    yield f"= Policy Enforcement{report_period_info} ="
     disposition_table = []
     for disposition, count in sorted(display_stats['disposition_overall'].items(), key=lambda x: x[1], reverse=True):
-        pct = (count / display_stats['total_messages']) * 100
-        disposition_table.append([disposition, count, f"{pct:.1f}%"])
-    report_lines.append(tabulate(disposition_table, headers=["Disposition", "Count", "%"], tablefmt="simple"))
-    report_lines.append("")
+        disposition_table.append([disposition, count, _format_percent(count, display_stats['total_messages'])])
+    yield _format_table(disposition_table, headers=["Disposition", "Count", "%"])
+    yield ""
     
     # Group IPs by source and display their domains
-    report_lines.append("= IP Sources Grouped by Organization" + report_period_info + " =")
+    yield f"= IP Sources Grouped by Organization{report_period_info} ="
     ip_groups = group_ips_by_source(display_stats['ips'], resolve=resolve_ips)
     
     group_table = []
@@ -73,33 +166,30 @@ def generate_report(stats, verbose=False, resolve_ips=False):
         num_ips = len(group_stats['ips'])
         domains_str = ', '.join(sorted(group_stats['domains']))
         
-        dkim_pass_pct = (group_stats['dkim_pass'] / group_stats['count']) * 100 if group_stats['count'] else 0
-        spf_pass_pct = (group_stats['spf_pass'] / group_stats['count']) * 100 if group_stats['count'] else 0
-        aligned_pct = (group_stats['fully_aligned'] / group_stats['count']) * 100 if group_stats['count'] else 0
-        
         group_table.append([
             org_name,
             num_ips,
             group_stats['count'],
-            f"{dkim_pass_pct:.1f}%",
-            f"{spf_pass_pct:.1f}%",
-            f"{aligned_pct:.1f}%",
-            domains_str[:50] + ('...' if len(domains_str) > 50 else '')
+            _format_percent(group_stats['dkim_pass'], group_stats['count']),
+            _format_percent(group_stats['spf_pass'], group_stats['count']),
+            _format_percent(group_stats['fully_aligned'], group_stats['count']),
+            f"{domains_str[:50]}..." if len(domains_str) > 50 else domains_str
         ])
     
-    report_lines.append(tabulate(group_table, 
-                                headers=["Source", "IPs", "Messages", "DKIM Pass", "SPF Pass", "Aligned", "Domains"], 
-                                tablefmt="simple"))
-    report_lines.append("")
+    yield _format_table(group_table, headers=["Source", "IPs", "Messages", "DKIM Pass", "SPF Pass", "Aligned", "Domains"])
+    yield ""
     
     # Top IP sources
-    report_lines.append("= Top IP Sources" + report_period_info + " =")
+    yield f"= Top IP Sources{report_period_info} ="
     ip_table = []
-    for ip, ip_stats in sorted(display_stats['ips'].items(), key=lambda x: x[1]['count'], reverse=True)[:10]:
-        dkim_pass_pct = (ip_stats['dkim_pass'] / ip_stats['count']) * 100 if ip_stats['count'] else 0
-        spf_pass_pct = (ip_stats['spf_pass'] / ip_stats['count']) * 100 if ip_stats['count'] else 0
-        fully_aligned_pct = (ip_stats['fully_aligned'] / ip_stats['count']) * 100 if ip_stats['count'] else 0
-        
+    ip_domain_strs = {}  # Sorted domain list per IP, reused by the detailed listing
+    # The verbose listing needs every IP in order; otherwise only the top 10 are selected
+    if verbose:
+        ips_by_count = sorted(display_stats['ips'].items(), key=lambda x: x[1]['count'], reverse=True)
+        top_ips = ips_by_count[:10]
+    else:
+        top_ips = heapq.nlargest(10, display_stats['ips'].items(), key=lambda x: x[1]['count'])
+    for ip, ip_stats in top_ips:
         # Add hostname if resolved
         ip_display = ip
         if resolve_ips:
@@ -107,93 +197,71 @@ def generate_report(stats, verbose=False, resolve_ips=False):
             if hostname:
                 ip_display = f"{ip} ({hostname})"
         
-        domains = ', '.join(sorted(ip_stats['domains']))
+        domains = ip_domain_strs[ip] = ', '.join(sorted(ip_stats['domains']))
         ip_table.append([
             ip_display, 
             ip_stats['count'],
-            f"{dkim_pass_pct:.1f}%", 
-            f"{spf_pass_pct:.1f}%", 
-            f"{fully_aligned_pct:.1f}%",
+            _format_percent(ip_stats['dkim_pass'], ip_stats['count']),
+            _format_percent(ip_stats['spf_pass'], ip_stats['count']),
+            _format_percent(ip_stats['fully_aligned'], ip_stats['count']),
             domains
         ])
-    report_lines.append(tabulate(ip_table, headers=["IP", "Messages", "DKIM Pass", "SPF Pass", "Aligned", "Domains"], tablefmt="simple"))
-    report_lines.append("")
+    yield _format_table(ip_table, headers=["IP", "Messages", "DKIM Pass", "SPF Pass", "Aligned", "Domains"])
+    yield ""
     
     # Failures by domain
     if display_stats['failures_by_domain']:
-        report_lines.append("= Authentication Failures by Domain" + report_period_info + " =")
+        yield f"= Authentication Failures by Domain{report_period_info} ="
         failures_table = []
         for domain, count in sorted(display_stats['failures_by_domain'].items(), key=lambda x: x[1], reverse=True):
             failures_table.append([domain, count])
-        report_lines.append(tabulate(failures_table, headers=["Domain", "Failures"], tablefmt="simple"))
-        report_lines.append("")
+        yield _format_table(failures_table, headers=["Domain", "DMARC Failures"])
+        yield ""
     
     # DMARC Policy Recommendations
-    report_lines.append("= DMARC Policy Recommendations =")  # Recommendations already use recent stats
-    policy_recommendations = generate_policy_recommendations(stats_bundle)  # Pass the whole bundle
+    yield "= DMARC Policy Recommendations ="  # Recommendations already use recent stats
+    policy_recommendations = recommendations
+    if policy_recommendations is None:
+        policy_recommendations = generate_policy_recommendations(stats_bundle)  # Pass the whole bundle
     
     for policy_rec in policy_recommendations:
         domain = policy_rec['domain']
         domain_stats = policy_rec['stats']
         
-        report_lines.append(f"\nDomain: {domain}")
-        report_lines.append(f"Current DMARC Policy: p={domain_stats['current_policy']}, pct={domain_stats['current_pct']}%, sp={domain_stats['current_sp']}")
-        report_lines.append(f"Messages: {domain_stats['messages']} from {domain_stats['num_sources']} source IPs")
-        report_lines.append(f"Authentication Rates: DKIM {domain_stats['dkim_rate']:.1f}%, SPF {domain_stats['spf_rate']:.1f}%, Aligned {domain_stats['alignment_rate']:.1f}%")
+        yield f"\nDomain: {domain}"
+        yield f"Current DMARC Policy: p={domain_stats['current_policy']}, pct={domain_stats['current_pct']}%, sp={domain_stats['current_sp']}"
+        yield f"Messages: {domain_stats['messages']} from {domain_stats['num_sources']} source IPs"
+        yield f"Authentication Rates: DKIM {domain_stats['dkim_rate']:.1f}%, SPF {domain_stats['spf_rate']:.1f}%, Aligned {domain_stats['alignment_rate']:.1f}%"
         
         # Policy results table
         if domain_stats['policy_results']:
             policy_table = []
             for disp, count in domain_stats['policy_results'].items():
-                pct = (count / domain_stats['messages']) * 100 if domain_stats['messages'] > 0 else 0
-                policy_table.append([disp, count, f"{pct:.1f}%"])
-            report_lines.append("Policy Application Results:")
-            report_lines.append(tabulate(policy_table, headers=["Disposition", "Count", "%"], tablefmt="simple"))
+                policy_table.append([disp, count, _format_percent(count, domain_stats['messages'])])
+            yield "Policy Application Results:"
+            yield _format_table(policy_table, headers=["Disposition", "Count", "%"])
         
-        report_lines.append("Recommendations:")
+        yield "Recommendations:"
         if policy_rec['recommendations']:
             for rec in policy_rec['recommendations']:
-                report_lines.append(f"  - {rec}")
+                yield f"  - {rec}"
         else:
-            report_lines.append("  - No specific recommendations.")
+            yield "  - No specific recommendations."
     
     # DMARC Policy Reference Guide
-    report_lines.append("\n= DMARC Policy Reference Guide =")
-    report_lines.append("Policy Values (p=):")
-    report_lines.append("  none - Monitor only, take no action on failures (monitoring mode)")
-    report_lines.append("  quarantine - Mark or junk messages that fail authentication")
-    report_lines.append("  reject - Block messages that fail authentication")
-    
-    report_lines.append("\nPercentage (pct=):")
-    report_lines.append("  Controls what percentage of messages are subject to filtering")
-    report_lines.append("  Start low (5-10%) and gradually increase as confidence grows")
-    
-    report_lines.append("\nSubdomain Policy (sp=):")
-    report_lines.append("  Controls policy for subdomains (e.g., mail from sub.example.com when domain is example.com)")
-    report_lines.append("  Often set to 'reject' to prevent subdomain spoofing")
-    
-    report_lines.append("\nDMARC Policy Progression Path:")
-    report_lines.append("  1. p=none with RUA/RUF reporting enabled")
-    report_lines.append("  2. p=quarantine with low pct value (5-25%)")
-    report_lines.append("  3. Gradually increase pct value to 100%")
-    report_lines.append("  4. p=reject with low pct value (5-25%)")
-    report_lines.append("  5. Gradually increase pct value to 100%")
+    yield from _POLICY_REFERENCE_GUIDE
     
     # General recommendations
-    report_lines.append("\n= General DMARC Implementation Tips =")
+    yield "\n= General DMARC Implementation Tips ="
     if dkim_pass_pct < 90 or spf_pass_pct < 90:
-        report_lines.append("- Fix authentication issues before increasing enforcement levels")
-    report_lines.append("- Implement proper SPF, DKIM and DMARC for all domains, even non-sending domains")
-    report_lines.append("- Monitor reports regularly and adjust policies based on findings")
-    report_lines.append("- Coordinate with third-party senders to ensure they authenticate properly")
-    report_lines.append("- Consider using multiple DKIM selectors for different mail streams")
-    report_lines.append("- Implement a process to respond to authentication failures quickly")
+        yield "- Fix authentication issues before increasing enforcement levels"
+    yield from _GENERAL_TIPS
     
     # If verbose, include more detailed IP information
     if verbose:
-        report_lines.append("")
-        report_lines.append("= Detailed IP Information" + report_period_info + " =")
-        for ip, ip_stats in sorted(display_stats['ips'].items(), key=lambda x: x[1]['count'], reverse=True):
+        yield ""
+        yield f"= Detailed IP Information{report_period_info} ="
+        for ip, ip_stats in ips_by_count:
             # Add hostname if resolved
             ip_display = ip
             if resolve_ips:
@@ -201,14 +269,17 @@ def generate_report(stats, verbose=False, resolve_ips=False):
                 if hostname:
                     ip_display = f"{ip} ({hostname})"
                     
-            report_lines.append(f"\nIP: {ip_display}")
-            report_lines.append(f"Message Count: {ip_stats['count']}")
-            report_lines.append(f"Domains: {', '.join(sorted(ip_stats['domains']))}")
-            report_lines.append(f"DKIM: {ip_stats['dkim_pass']} pass, {ip_stats['dkim_fail']} fail")
-            report_lines.append(f"SPF: {ip_stats['spf_pass']} pass, {ip_stats['spf_fail']} fail")
-            report_lines.append(f"Fully Aligned: {ip_stats['fully_aligned']}")
-            report_lines.append("Dispositions:")
+            domains = ip_domain_strs.get(ip)
+            if domains is None:
+                domains = ', '.join(sorted(ip_stats['domains']))
+            yield from (
+                f"\nIP: {ip_display}",
+                f"Message Count: {ip_stats['count']}",
+                f"Domains: {domains}",
+                f"DKIM: {ip_stats['dkim_pass']} pass, {ip_stats['dkim_fail']} fail",
+                f"SPF: {ip_stats['spf_pass']} pass, {ip_stats['spf_fail']} fail",
+                f"Fully Aligned: {ip_stats['fully_aligned']}",
+                "Dispositions:"
+            )
             for disp, count in ip_stats['disposition'].items():
-                report_lines.append(f"  - {disp}: {count}")
-    
-    return "\n".join(report_lines)
+                yield f"  - {disp}: {count}"
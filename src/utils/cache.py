@@ -0,0 +1,113 @@
+"""
+Parsed Report Cache for the DMARC Analyzer.
+
+This module stores parsed DMARC reports on disk so that report files which
+have not changed since a previous run don't need to be extracted and parsed
+again.
+"""
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import tempfile
+
+# Bump whenever the structure produced by parse_dmarc_report changes so that
+# stale cache entries are ignored
+CACHE_VERSION = 3
+
+# Cache entries that have not been read for this long are removed by prune_cache
+MAX_ENTRY_AGE = 30 * 24 * 60 * 60
+
+
+def get_cache_dir():
+    """Return the directory used to cache parsed reports."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'dmarcer')
+
+
+def _cache_path(cache_dir, filepath, parse_auth_details, xml_parser):
+    """Return the cache file for a report file, keyed by its path, size, modification time and parse options."""
+    stat = os.stat(filepath)
+    key = (f"{CACHE_VERSION}:{os.path.abspath(filepath)}:{stat.st_mtime_ns}:{stat.st_size}:"
+           f"{parse_auth_details}:{xml_parser}")
+    return os.path.join(cache_dir, hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + '.pkl')
+
+
+def load_cached_report(cache_dir, filepath, parse_auth_details=False, xml_parser=None):
+    """
+    Load a previously parsed report from the cache.
+
+    Args:
+        cache_dir: Directory containing the cached reports
+        filepath: Path to the DMARC report file
+        parse_auth_details: Whether the report must include per-record auth results
+        xml_parser: Name of the XML parser the report must have been parsed with
+
+    Returns:
+        dict: The cached report, or None if there is no usable cache entry
+    """
+    try:
+        cache_path = _cache_path(cache_dir, filepath, parse_auth_details, xml_parser)
+        with open(cache_path, 'rb') as f:
+            report = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        print(f"Ignoring unreadable cache entry for {filepath}: {e}", file=sys.stderr)
+        return None
+
+    # Refresh the modification time so prune_cache keeps entries that are still in use
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return report
+
+
+def store_cached_report(cache_dir, filepath, report, parse_auth_details=False, xml_parser=None):
+    """Store a parsed report in the cache."""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = _cache_path(cache_dir, filepath, parse_auth_details, xml_parser)
+        # Write to a temporary file first so concurrent runs never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(report, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Could not cache parsed report for {filepath}: {e}", file=sys.stderr)
+
+
+def prune_cache(cache_dir, max_age=MAX_ENTRY_AGE):
+    """
+    Remove cached reports that have not been used recently.
+
+    Entries for report files that were changed, moved or deleted are never
+    read again, so they are removed once they are older than ``max_age``.
+
+    Args:
+        cache_dir: Directory containing the cached reports
+        max_age: Age in seconds after which unused entries are removed
+    """
+    cutoff = time.time() - max_age
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.pkl'):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    # Already removed by a concurrent run
+                    pass
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not prune report cache in {cache_dir}: {e}", file=sys.stderr)
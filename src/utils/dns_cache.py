@@ -0,0 +1,130 @@
+"""
+Reverse DNS Cache for the DMARC Analyzer.
+
+This module keeps the results of reverse DNS lookups in a JSON file so that
+the same source IPs don't have to be looked up again on every run. Failed
+lookups are cached too, but expire sooner so that newly added PTR records
+are picked up.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import tempfile
+import threading
+
+from utils.cache import get_cache_dir
+
+# How long successful and failed lookups stay valid, in seconds
+POSITIVE_TTL = 7 * 24 * 60 * 60
+NEGATIVE_TTL = 24 * 60 * 60
+
+_cache_file = os.path.join(get_cache_dir(), 'dns.json')
+_entries = None  # IP -> [hostname or None, expiry timestamp]
+_dirty = False
+_lock = threading.Lock()
+
+
+def configure(cache_dir):
+    """
+    Set the directory the DNS cache is stored in.
+
+    Args:
+        cache_dir: Directory for the cache file, or None to keep lookups in memory only
+    """
+    global _cache_file, _entries
+    _cache_file = os.path.join(cache_dir, 'dns.json') if cache_dir else None
+    _entries = None
+
+
+def _load():
+    """Load the cache file, dropping expired entries."""
+    global _entries
+    with _lock:
+        if _entries is None:
+            _entries = _read_cache_file()
+
+
+def _read_cache_file():
+    """Read the unexpired entries from the cache file."""
+    entries = {}
+    if not _cache_file:
+        return entries
+
+    try:
+        with open(_cache_file, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return entries
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable DNS cache {_cache_file}: {e}", file=sys.stderr)
+        return entries
+
+    now = time.time()
+    for ip, entry in data.items() if isinstance(data, dict) else ():
+        if (isinstance(entry, list) and len(entry) == 2
+                and isinstance(entry[1], (int, float)) and entry[1] > now):
+            entries[ip] = entry
+    return entries
+
+
+def lookup(ip):
+    """
+    Look up a cached reverse DNS result.
+
+    Args:
+        ip: IP address to look up
+
+    Returns:
+        tuple: (found, hostname) where hostname is None for cached failures
+    """
+    if _entries is None:
+        _load()
+    entry = _entries.get(ip)
+    if entry is None or entry[1] <= time.time():
+        return False, None
+    return True, entry[0]
+
+
+def store(ip, hostname):
+    """
+    Cache the result of a reverse DNS lookup.
+
+    Args:
+        ip: IP address that was looked up
+        hostname: The resolved hostname, or None if the lookup failed
+    """
+    global _dirty
+    if _entries is None:
+        _load()
+    ttl = POSITIVE_TTL if hostname else NEGATIVE_TTL
+    _entries[ip] = [hostname, time.time() + ttl]
+    _dirty = True
+
+
+def save():
+    """Write the DNS cache to disk if it changed."""
+    global _dirty
+    if not _dirty or not _cache_file:
+        return
+
+    cache_dir = os.path.dirname(_cache_file)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(_entries, f)
+            os.replace(tmp_path, _cache_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        _dirty = False
+    except OSError as e:
+        print(f"Could not save DNS cache to {_cache_file}: {e}", file=sys.stderr)
+
+
+# save() does nothing unless entries were added, so it is safe to always register
+atexit.register(save)
@@ -6,7 +6,22 @@ This module contains various helper functions used across the DMARC analyzer.
 
 import socket
 import html
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from utils import dns_cache
+
+# dnspython is optional; when installed it is used for reverse lookups so that
+# a slow DNS server can't stall a report beyond DNS_TIMEOUT per lookup
+try:
+    import dns.exception
+    import dns.resolver
+except ImportError:
+    dns = None
+
+# Seconds to wait for a reverse lookup when using dnspython
+DNS_TIMEOUT = 2.0
 
 # Default time periods in days
 TIME_PERIODS = {
@@ -48,6 +63,10 @@ ORG_PATTERNS = {
     'nationbuilder.com': 'NationBuilder',
 }
 
+# ORG_PATTERNS ordered so that the most specific (longest) pattern matching a
+# hostname wins, e.g. 'office365' before 'outlook'
+_ORG_PATTERNS_LONGEST_FIRST = tuple(sorted(ORG_PATTERNS.items(), key=lambda item: len(item[0]), reverse=True))
+
 # Map provider patterns to their main domains for favicon retrieval
 PROVIDER_DOMAINS = {
     'google': "google.com",
@@ -87,18 +106,74 @@ PROVIDER_ICONS = {
 }
 
 
+@lru_cache(maxsize=4096)
 def resolve_ip(ip):
-    """Resolve an IP address to a hostname using reverse DNS lookup."""
-    try:
-        hostname = socket.gethostbyaddr(ip)[0]
+    """
+    Resolve an IP address to a hostname using reverse DNS lookup.
+    
+    Results, including failed lookups, are memoized for the rest of the run on
+    top of the on-disk DNS cache, since the reports look up the same IPs
+    several times.
+    """
+    found, hostname = dns_cache.lookup(ip)
+    if found:
         return hostname
-    except (socket.herror, socket.gaierror):
+    
+    hostname = _reverse_lookup(ip)
+    dns_cache.store(ip, hostname)
+    return hostname
+
+
+@lru_cache(maxsize=None)
+def _get_dns_resolver():
+    """Return a dnspython resolver, or None if dnspython is unavailable or has no configuration."""
+    if dns is None:
+        return None
+    try:
+        resolver = dns.resolver.Resolver()
+    except dns.exception.DNSException:
+        return None
+    resolver.lifetime = DNS_TIMEOUT
+    return resolver
+
+
+def _reverse_lookup(ip):
+    """Look up the PTR hostname for an IP address, returning None if it can't be resolved."""
+    resolver = _get_dns_resolver()
+    if resolver is None:
+        try:
+            return socket.gethostbyaddr(ip)[0]
+        except (socket.herror, socket.gaierror):
+            return None
+    
+    try:
+        answer = resolver.resolve_address(ip)
+    except (dns.exception.DNSException, ValueError):
         return None
+    return answer[0].target.to_text(omit_final_dot=True)
 
 
-def group_ips_by_source(ips_stats, resolve=False):
-    """Group IP addresses by their source organization based on reverse DNS lookups."""
-    ip_groups = defaultdict(lambda: {
+def prewarm_dns(ips, workers=32):
+    """
+    Resolve IP addresses concurrently so that later resolve_ip calls are cache hits.
+    
+    Args:
+        ips: IP addresses to resolve
+        workers: Maximum number of concurrent lookups
+    """
+    ips = list(ips)
+    if not ips:
+        return
+    
+    # Lookups spend nearly all their time waiting on the network, so threads overlap them well
+    with ThreadPoolExecutor(max_workers=min(workers, len(ips))) as executor:
+        for _ in executor.map(resolve_ip, ips):
+            pass
+
+
+def _new_ip_group():
+    """Create empty statistics for a group of IPs from the same source."""
+    return {
         'ips': [],
         'count': 0,
         'domains': set(),
@@ -107,52 +182,73 @@ def group_ips_by_source(ips_stats, resolve=False):
         'spf_pass': 0,
         'spf_fail': 0,
         'fully_aligned': 0,
-        'dispositions': defaultdict(int)
-    })
+        'dispositions': Counter()
+    }
+
+
+def identify_ip_source(ip, resolve=False):
+    """Determine the source organization of an IP address based on its reverse DNS lookup."""
+    hostname = None
+    if resolve:
+        hostname = resolve_ip(ip)
+    
+    return _org_from_hostname(hostname) if hostname else "Unknown"
+
+
+@lru_cache(maxsize=4096)
+def _org_from_hostname(hostname):
+    """Determine the source organization for a hostname."""
+    # Check if hostname matches any known patterns
+    hostname_lower = hostname.lower()
+    for pattern, name in _ORG_PATTERNS_LONGEST_FIRST:
+        if pattern in hostname_lower:
+            return name
+    
+    # Otherwise use a simplified domain from hostname
+    head, sep, _ = hostname.rpartition('.')
+    if sep:
+        return head.rpartition('.')[2].capitalize()  # Use the second-level domain
+    return "Unknown"
+
+
+def group_ips_by_source(ips_stats, resolve=False, source_cache=None):
+    """
+    Group IP addresses by their source organization based on reverse DNS lookups.
+    
+    Args:
+        ips_stats: Per-IP statistics keyed by IP address
+        resolve: Whether to resolve IP addresses to hostnames
+        source_cache: Optional dict mapping IPs to organizations, shared between
+            calls so that each IP is only identified once
+    """
+    ip_groups = defaultdict(_new_ip_group)
     
     for ip, stats in ips_stats.items():
-        hostname = None
-        if resolve:
-            hostname = resolve_ip(ip)
-        
-        # Determine the organization
-        org_name = "Unknown"
-        hostname_domain = None
-        
-        if hostname:
-            # Extract domain from hostname for potential favicon use
-            parts = hostname.split('.')
-            if len(parts) >= 2:
-                hostname_domain = f"{parts[-2]}.{parts[-1]}"
-            
-            # Check if hostname matches any known patterns
-            hostname_lower = hostname.lower()
-            for pattern, name in ORG_PATTERNS.items():
-                if pattern in hostname_lower:
-                    org_name = name
-                    break
-            
-            # If still unknown, use a simplified domain from hostname
-            if org_name == "Unknown" and len(parts) >= 2:
-                org_name = parts[-2].capitalize()  # Use the second-level domain
+        if source_cache is None:
+            org_name = identify_ip_source(ip, resolve)
+        else:
+            org_name = source_cache.get(ip)
+            if org_name is None:
+                org_name = source_cache[ip] = identify_ip_source(ip, resolve)
         
         # Add IP to the appropriate group
-        ip_groups[org_name]['ips'].append(ip)
-        ip_groups[org_name]['count'] += stats['count']
-        ip_groups[org_name]['domains'].update(stats['domains'])
-        ip_groups[org_name]['dkim_pass'] += stats['dkim_pass']
-        ip_groups[org_name]['dkim_fail'] += stats['dkim_fail']
-        ip_groups[org_name]['spf_pass'] += stats['spf_pass']
-        ip_groups[org_name]['spf_fail'] += stats['spf_fail']
-        ip_groups[org_name]['fully_aligned'] += stats['fully_aligned']
+        group = ip_groups[org_name]
+        group['ips'].append(ip)
+        group['count'] += stats['count']
+        group['domains'].update(stats['domains'])
+        group['dkim_pass'] += stats['dkim_pass']
+        group['dkim_fail'] += stats['dkim_fail']
+        group['spf_pass'] += stats['spf_pass']
+        group['spf_fail'] += stats['spf_fail']
+        group['fully_aligned'] += stats['fully_aligned']
         
         # Update dispositions
-        for disp, count in stats['disposition'].items():
-            ip_groups[org_name]['dispositions'][disp] += count
+        group['dispositions'].update(stats['disposition'])
     
     return ip_groups
 
 
+@lru_cache(maxsize=2048)
 def get_favicon_url(domain):
     """Generate a favicon URL for a domain."""
     return f"https://icons.duckduckgo.com/ip3/{html.escape(domain)}.ico"
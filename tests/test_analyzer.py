@@ -0,0 +1,49 @@
+"""
+Tests for the DMARC report analysis.
+"""
+
+import os
+import sys
+import copy
+import contextlib
+import io
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parsers.dmarc_parser import parse_dmarc_report
+from analysis.analyzer import analyze_reports
+
+TEST_REPORT = os.path.join(os.path.dirname(__file__), '..', 'test_reports', 'mixed_auth.xml')
+
+
+class PeriodTest(unittest.TestCase):
+    """Reports are assigned to time periods by their end date."""
+
+    def setUp(self):
+        with open(TEST_REPORT, 'rb') as f:
+            self.report = parse_dmarc_report(f)
+        self.report_messages = analyze_reports([self.report], ['all'])['periods']['all']['stats']['total_messages']
+
+    def test_report_without_end_ts_uses_end_date(self):
+        undated = copy.deepcopy(self.report)
+        del undated['metadata']['end_ts']
+        stats_bundle = analyze_reports([self.report, undated], ['30', '90', 'all'])
+        for period in ('30', '90', 'all'):
+            with self.subTest(period=period):
+                self.assertEqual(stats_bundle['periods'][period]['stats']['total_messages'],
+                                 2 * self.report_messages)
+
+    def test_report_without_end_date_is_only_in_all(self):
+        undated = copy.deepcopy(self.report)
+        del undated['metadata']['end_ts']
+        del undated['metadata']['end_date_dt']
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            stats_bundle = analyze_reports([self.report, undated], ['30', 'all'])
+        self.assertIn('no end date', stderr.getvalue())
+        self.assertEqual(stats_bundle['periods']['30']['stats']['total_messages'], self.report_messages)
+        self.assertEqual(stats_bundle['periods']['all']['stats']['total_messages'], 2 * self.report_messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Tests for the DMARC report parser.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from parsers import dmarc_parser
+from parsers.dmarc_parser import parse_dmarc_report
+
+TEST_REPORT = os.path.join(os.path.dirname(__file__), '..', 'test_reports', 'mixed_auth.xml')
+
+
+def _report_with_doctype(doctype):
+    """Return the test report as bytes with a DOCTYPE inserted after the XML declaration."""
+    with open(TEST_REPORT, 'rb') as f:
+        declaration, rest = f.read().split(b'\n', 1)
+    return declaration + b'\n' + doctype + b'\n' + rest
+
+
+class DoctypeTest(unittest.TestCase):
+    """Both parser paths must accept and reject the same documents."""
+
+    def _parse_both(self, content):
+        return [parse_dmarc_report(content, safe_xml=safe_xml) for safe_xml in (False, True)]
+
+    @unittest.skipIf(dmarc_parser.lxml_etree is None, "lxml is not installed")
+    def test_bare_doctype_parses_the_same_with_both_parsers(self):
+        lxml_report, defused_report = self._parse_both(_report_with_doctype(b'<!DOCTYPE feedback>'))
+        self.assertIsNotNone(lxml_report)
+        self.assertIsNotNone(defused_report)
+        self.assertEqual(lxml_report['records'], defused_report['records'])
+        self.assertEqual(len(lxml_report['records']), 2)
+
+    @unittest.skipIf(dmarc_parser.lxml_etree is None, "lxml is not installed")
+    def test_entity_declarations_are_rejected_by_both_parsers(self):
+        for doctype in (b'<!DOCTYPE feedback [<!ENTITY a "x">]>',
+                        b'<!DOCTYPE feedback [<!ENTITY a SYSTEM "file:///etc/passwd">]>'):
+            with self.subTest(doctype=doctype):
+                self.assertEqual(self._parse_both(_report_with_doctype(doctype)), [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()